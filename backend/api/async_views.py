@@ -0,0 +1,182 @@
+"""Асинхронные GET-обработчики горячих эндпоинтов для запуска под ASGI.
+
+Отдают то же, что ``RecipeViewSet.list``/``retrieve``,
+``IngredientViewSet.list`` и ``UserViewSet.subscriptions``, но ходят в
+базу и кэш через асинхронные API Django и не занимают поток на время
+ожидания. Фильтры, пагинаторы и сериализаторы берутся из тех же
+вьюсетов, реплика для чтения выбирается как в ``ReplicaReadsMixin``;
+сериализация идёт по заранее загруженным объектам и в базу не
+обращается. Ответы — только JSON.
+
+Подключаются в ``foodgram.asgi_urls``; остальные методы тех же адресов
+уходят в синхронные маршруты ``foodgram.urls``. Под WSGI работают
+обычные вьюсеты.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.shortcuts import aget_object_or_404
+from django.urls import resolve
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+
+from api import cache, conditional
+from api.authentication import AsyncTokenAuthentication
+from api.pagination import apaginate_queryset
+from api.serializers import (RecipeDetailSerializer, RecipeReadSerializer,
+                             SubscriptionSerializer)
+from api.utils import aattach_recipes_preview, recipes_limit
+from api.views import RecipeViewSet, UserViewSet
+from foodgram import db_router
+from recipes.ingredient_index import ingredient_index
+
+SYNC_URLCONF = 'foodgram.urls'
+# Фильтры, которые проверяют значение запросом к базе.
+MODEL_FILTERS = ('author',)
+
+authentication = AsyncTokenAuthentication()
+
+
+def _render(request, response):
+    if not isinstance(response, Response):
+        return response
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = JSONRenderer.media_type
+    response.renderer_context = {'request': request, 'response': response}
+    patch_vary_headers(response, ('Accept',))
+    return response.render()
+
+
+def _handle_exception(request, exc):
+    response = exception_handler(exc, {'request': request})
+    if response is None:
+        raise exc
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        response['WWW-Authenticate'] = authentication.authenticate_header(
+            request)
+    return response
+
+
+def get_or_sync(view):
+    """GET и HEAD отдаёт корутине ``view``, остальное — синхронному маршруту.
+
+    ``view`` получает запрос DRF с пользователем из токена и возвращает
+    ``Response``; исключения DRF превращаются в ответы как во вьюсетах.
+    """
+    @csrf_exempt
+    @functools.wraps(view)
+    async def dispatch(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            match = resolve(request.path_info, urlconf=SYNC_URLCONF)
+            return await sync_to_async(match.func)(
+                request, *match.args, **match.kwargs)
+        request = Request(request, authenticators=())
+        with db_router.routing() as state:
+            try:
+                user, request.auth = (
+                    await authentication.aauthenticate(request)
+                    or (AnonymousUser(), None)
+                )
+                request.user = user
+                state.replica = await sync_to_async(db_router.choose)(
+                    request)
+                response = await view(request, *args, **kwargs)
+            except Exception as exc:
+                response = _handle_exception(request, exc)
+        return _render(request, response)
+    return dispatch
+
+
+def _viewset(viewset_class, request, action, **kwargs):
+    view = viewset_class(request=request, args=(), kwargs=kwargs,
+                         action=action, format_kwarg=None)
+    view.headers = {}
+    return view
+
+
+async def _filter(view, queryset):
+    if any(name in view.request.query_params for name in MODEL_FILTERS):
+        return await sync_to_async(view.filter_queryset)(queryset)
+    return view.filter_queryset(queryset)
+
+
+async def _cached(key, request, get_data):
+    data = await cache.aget_response_data(key)
+    if data is None:
+        data = await get_data()
+        await cache.astore_response_data(key, data)
+        return Response(data)
+    return Response(await cache.apersonalize(data, request.user))
+
+
+@get_or_sync
+async def recipe_list(request):
+    view = _viewset(RecipeViewSet, request, 'list')
+    queryset = await _filter(view, view.get_annotated_queryset())
+
+    async def get_data():
+        page = await apaginate_queryset(
+            view.paginator, view.prefetch_ingredients(queryset), request)
+        data = RecipeReadSerializer(
+            page, many=True, context=view.get_serializer_context()).data
+        return view.get_paginated_response(data).data
+
+    async def get_response():
+        if not cache.is_cacheable(request):
+            return Response(await get_data())
+        return await _cached(await cache.alist_key(request), request,
+                             get_data)
+
+    etag, last_modified = await conditional.arecipes_state(request)
+    return await conditional.aevaluate(request, etag, last_modified,
+                                       get_response)
+
+
+@get_or_sync
+async def recipe_detail(request, pk):
+    view = _viewset(RecipeViewSet, request, 'retrieve', pk=pk)
+    state = await view.get_annotated_queryset().filter(pk=pk).values_list(
+        *conditional.RECIPE_STATE_FIELDS).afirst()
+
+    async def get_data():
+        recipe = await aget_object_or_404(
+            await _filter(view, view.get_queryset()), pk=pk)
+        return RecipeDetailSerializer(
+            recipe, context=view.get_serializer_context()).data
+
+    async def get_response():
+        return await _cached(await cache.adetail_key(request, pk), request,
+                             get_data)
+
+    if state is None:
+        return await get_response()
+    return await conditional.aevaluate(
+        request, *conditional.recipe_validators(
+            request, state, await cache.arecipe_versions(pk)),
+        get_response)
+
+
+@get_or_sync
+async def ingredient_list(request):
+    name = request.query_params.get('name')
+    if name:
+        return Response(await ingredient_index.asearch(name))
+    return Response(await ingredient_index.aall())
+
+
+@get_or_sync
+async def subscriptions(request):
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+    view = _viewset(UserViewSet, request, 'subscriptions')
+    page = await apaginate_queryset(
+        view.paginator, view.get_subscribed_authors(), request)
+    await aattach_recipes_preview(page, recipes_limit(request))
+    return view.get_paginated_response(SubscriptionSerializer(
+        page, many=True, context={'request': request}).data)
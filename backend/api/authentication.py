@@ -0,0 +1,196 @@
+"""Аутентификация по токену с кэшем токенов и пользователей.
+
+Токен вместе с пользователем ищется сначала в LRU процесса на
+``TOKEN_CACHE_SIZE`` записей, затем в общем кэше и только потом в
+базе. В общем кэше запись живёт ``TOKEN_CACHE_TIMEOUT`` секунд и
+удаляется сигналами ``api.signals`` при удалении токена (выход через
+djoser) и при сохранении или удалении пользователя (смена пароля,
+деактивация). Записи LRU живут ``TOKEN_CACHE_LOCAL_TTL`` секунд: сигнал
+чистит LRU только своего процесса, и в остальных процессах отозванный
+токен действует не дольше этого срока — если кэш ``default`` общий для
+процессов. С кэшем в памяти процесса сброс не дошёл бы до других
+процессов, поэтому там ``TOKEN_CACHE_ENABLED`` по умолчанию выключен и
+токен каждый раз читается из базы, как в ``TokenAuthentication``.
+Изменения через ``QuerySet.update`` сигналов не шлют; счётчики и
+нарезка аватаров сбрасывают кэш сами.
+
+Пользователь из кэша может отставать от базы, поэтому небезопасные
+запросы перечитывают его из базы: иначе ``save()`` записал бы поверх
+свежих столбцов устаревшие значения.
+"""
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+
+from metrics.registry import record_cache
+
+TOKEN_KEY = 'auth:token:{}'
+USER_TOKEN_KEY = 'auth:user:{}'
+
+
+def _digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class TokenCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires, _, data = entry
+            if expires < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+        return pickle.loads(data)
+
+    def _set_local(self, token):
+        entry = (time.monotonic() + settings.TOKEN_CACHE_LOCAL_TTL,
+                 token.user_id, pickle.dumps(token))
+        with self._lock:
+            self._local[token.key] = entry
+            self._local.move_to_end(token.key)
+            while len(self._local) > settings.TOKEN_CACHE_SIZE:
+                self._local.popitem(last=False)
+
+    def _shared_entries(self, token):
+        digest = _digest(token.key)
+        return {TOKEN_KEY.format(digest): token,
+                USER_TOKEN_KEY.format(token.user_id): digest}
+
+    def get(self, key):
+        if not settings.TOKEN_CACHE_ENABLED:
+            return None
+        token = self._get_local(key)
+        if token is None:
+            token = cache.get(TOKEN_KEY.format(_digest(key)))
+            if token is not None:
+                self._set_local(token)
+        record_cache('auth_tokens', token is not None)
+        return token
+
+    async def aget(self, key):
+        if not settings.TOKEN_CACHE_ENABLED:
+            return None
+        token = self._get_local(key)
+        if token is None:
+            token = await cache.aget(TOKEN_KEY.format(_digest(key)))
+            if token is not None:
+                self._set_local(token)
+        record_cache('auth_tokens', token is not None)
+        return token
+
+    def set(self, token):
+        if not settings.TOKEN_CACHE_ENABLED:
+            return
+        cache.set_many(self._shared_entries(token),
+                       settings.TOKEN_CACHE_TIMEOUT)
+        self._set_local(token)
+
+    async def aset(self, token):
+        if not settings.TOKEN_CACHE_ENABLED:
+            return
+        await cache.aset_many(self._shared_entries(token),
+                              settings.TOKEN_CACHE_TIMEOUT)
+        self._set_local(token)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+        cache.delete(TOKEN_KEY.format(_digest(key)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in [key for key, (_, owner, _) in self._local.items()
+                        if owner == user_id]:
+                del self._local[key]
+        digest = cache.get(USER_TOKEN_KEY.format(user_id))
+        if digest is not None:
+            cache.delete_many([TOKEN_KEY.format(digest),
+                               USER_TOKEN_KEY.format(user_id)])
+
+
+tokens = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication``, который берёт токен из ``tokens``."""
+
+    def get_token(self, key):
+        model = self.get_model()
+        try:
+            return model.objects.select_related('user').get(key=key)
+        except model.DoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+
+    async def aget_token(self, key):
+        model = self.get_model()
+        try:
+            return await model.objects.select_related('user').aget(key=key)
+        except model.DoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+
+    @staticmethod
+    def check_user(token):
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
+
+    def authenticate_credentials(self, key):
+        token = tokens.get(key)
+        if token is None:
+            token = self.get_token(key)
+            tokens.set(token)
+        return self.check_user(token)
+
+    def authenticate(self, request):
+        credentials = super().authenticate(request)
+        if credentials is None or request.method in SAFE_METHODS:
+            return credentials
+        user, token = credentials
+        try:
+            user.refresh_from_db()
+        except type(user).DoesNotExist:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return self.check_user(token)
+
+
+class AsyncTokenAuthentication(CachedTokenAuthentication):
+    """``CachedTokenAuthentication`` для асинхронных представлений.
+
+    Заголовок разбирает родительский ``authenticate``, а ключ проверяет
+    ``aauthenticate`` через асинхронные API кэша и ORM.
+    """
+
+    def authenticate_credentials(self, key):
+        return key
+
+    async def aauthenticate(self, request):
+        key = TokenAuthentication.authenticate(self, request)
+        if key is None:
+            return None
+        token = await tokens.aget(key)
+        if token is None:
+            token = await self.aget_token(key)
+            await tokens.aset(token)
+        if request.method not in SAFE_METHODS:
+            await token.user.arefresh_from_db()
+        return self.check_user(token)
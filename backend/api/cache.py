@@ -0,0 +1,218 @@
+"""Кэш ответов RecipeViewSet с версиями и пользовательскими флагами.
+
+В кэше лежит «анонимное» тело ответа: ``is_favorited``,
+``is_in_shopping_cart`` и ``author.is_subscribed`` в нём всегда ложны и
+накладываются для текущего пользователя при каждой выдаче. Ключи
+содержат глобальную версию и версию рецепта, которые сигналы из
+``api.signals`` меняют после записи, поэтому старые записи просто
+перестают читаться и вытесняются по таймауту.
+"""
+import hashlib
+import time
+from copy import deepcopy
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Value
+
+from foodgram import db_router
+from metrics.registry import record_cache
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+GLOBAL_VERSION_KEY = 'recipes:version'
+RECIPE_VERSION_KEY = 'recipes:version:{}'
+USER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def bump_version(key):
+    cache.set(key, time.time_ns(), None)
+
+
+def bump_global_version():
+    bump_version(GLOBAL_VERSION_KEY)
+
+
+def bump_recipe_version(recipe_id, bump_global=True):
+    bump_version(RECIPE_VERSION_KEY.format(recipe_id))
+    if bump_global:
+        bump_global_version()
+
+
+def bump_recipe_versions(recipe_ids):
+    """Версии нескольких рецептов одной записью; общая не меняется."""
+    version = time.time_ns()
+    cache.set_many({RECIPE_VERSION_KEY.format(pk): version
+                    for pk in recipe_ids}, None)
+
+
+def _check_lag(versions):
+    # Изменённое позже окна отставания реплик читаем с default, иначе
+    # под новой версией в кэш попадёт старое тело с реплики.
+    age = time.time_ns() - max(versions)
+    if age < settings.DATABASE_REPLICA_PIN_SECONDS * 10 ** 9:
+        db_router.use_primary()
+    return versions
+
+
+def _versions(*keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = time.time_ns()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return _check_lag([versions[key] for key in keys])
+
+
+async def _aversions(*keys):
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = time.time_ns()
+            if not await cache.aadd(key, version, None):
+                version = await cache.aget(key, version)
+            versions[key] = version
+    return _check_lag([versions[key] for key in keys])
+
+
+def _request_fingerprint(request):
+    params = sorted(
+        (key, value) for key, values in request.query_params.lists()
+        for value in values
+    )
+    raw = f'{request.get_host()}{request.path}?{params}'
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def is_cacheable(request):
+    return not (
+        request.user.is_authenticated
+        and any(name in request.query_params for name in USER_FILTERS)
+    )
+
+
+def global_version():
+    version, = _versions(GLOBAL_VERSION_KEY)
+    return version
+
+
+async def aglobal_version():
+    version, = await _aversions(GLOBAL_VERSION_KEY)
+    return version
+
+
+def _list_key(request, version):
+    return f'recipes:list:{version}:{_request_fingerprint(request)}'
+
+
+def list_key(request):
+    return _list_key(request, global_version())
+
+
+async def alist_key(request):
+    return _list_key(request, await aglobal_version())
+
+
+def _detail_key(request, pk, versions):
+    return (f'recipes:detail:{pk}:{versions[0]}:{versions[1]}:'
+            f'{_request_fingerprint(request)}')
+
+
+def recipe_versions(pk):
+    """Глобальная версия и версия рецепта."""
+    return _versions(GLOBAL_VERSION_KEY, RECIPE_VERSION_KEY.format(pk))
+
+
+async def arecipe_versions(pk):
+    return await _aversions(GLOBAL_VERSION_KEY, RECIPE_VERSION_KEY.format(pk))
+
+
+def detail_key(request, pk):
+    return _detail_key(request, pk, recipe_versions(pk))
+
+
+async def adetail_key(request, pk):
+    return _detail_key(request, pk, await arecipe_versions(pk))
+
+
+def get_response_data(key):
+    data = cache.get(key)
+    record_cache('recipe_responses', data is not None)
+    return data
+
+
+async def aget_response_data(key):
+    data = await cache.aget(key)
+    record_cache('recipe_responses', data is not None)
+    return data
+
+
+def store_response_data(key, data):
+    cache.set(key, anonymize(data), settings.RECIPE_CACHE_TIMEOUT)
+
+
+async def astore_response_data(key, data):
+    await cache.aset(key, anonymize(data), settings.RECIPE_CACHE_TIMEOUT)
+
+
+def _recipes(data):
+    if isinstance(data, list):
+        return data
+    return data.get('results', [data])
+
+
+def _apply_flags(data, favorited, in_shopping_cart, subscribed):
+    data = deepcopy(data)
+    for recipe in _recipes(data):
+        recipe['is_favorited'] = recipe['id'] in favorited
+        recipe['is_in_shopping_cart'] = recipe['id'] in in_shopping_cart
+        recipe['author']['is_subscribed'] = (
+            recipe['author']['id'] in subscribed)
+    return data
+
+
+def anonymize(data):
+    return _apply_flags(data, set(), set(), set())
+
+
+def _flag_rows(user, recipes):
+    recipe_ids = [recipe['id'] for recipe in recipes]
+    author_ids = {recipe['author']['id'] for recipe in recipes}
+    return Favorite.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).annotate(kind=Value('favorite')).values_list('recipe_id', 'kind').union(
+        ShoppingCart.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).annotate(kind=Value('shopping_cart')).values_list(
+            'recipe_id', 'kind'),
+        Subscription.objects.filter(
+            user=user, author_id__in=author_ids
+        ).annotate(kind=Value('subscription')).values_list(
+            'author_id', 'kind'),
+        all=True
+    )
+
+
+def _apply_rows(data, rows):
+    flags = {'favorite': set(), 'shopping_cart': set(), 'subscription': set()}
+    for object_id, kind in rows:
+        flags[kind].add(object_id)
+    return _apply_flags(data, flags['favorite'], flags['shopping_cart'],
+                        flags['subscription'])
+
+
+def personalize(data, user):
+    recipes = _recipes(data)
+    if not user.is_authenticated or not recipes:
+        return data
+    return _apply_rows(data, _flag_rows(user, recipes))
+
+
+async def apersonalize(data, user):
+    recipes = _recipes(data)
+    if not user.is_authenticated or not recipes:
+        return data
+    return _apply_rows(
+        data, [row async for row in _flag_rows(user, recipes)])
@@ -0,0 +1,127 @@
+"""Условные GET-запросы (ETag / Last-Modified) для рецептов и профилей.
+
+Валидаторы рецептов строятся из версий кэша ``api.cache``: сигналы
+меняют глобальную версию при любой правке, от которой зависит тело
+списка (рецепты, их состав, авторы, ингредиенты, пересчёт оценок), а
+версию рецепта — при правке самого рецепта, его состава и связей с ним.
+Версия — время изменения в наносекундах, она же даёт ``Last-Modified``.
+Так список не читает таблицу рецептов до ответа 304, а карточка — только
+одну свою строку ради флагов.
+
+Флаги текущего пользователя входят в ETag, поэтому для авторизованных
+запросов ``Last-Modified`` не отдаётся: по времени изменения рецепта
+нельзя понять, что пользователь добавил его в избранное.
+"""
+import hashlib
+from datetime import datetime, timezone
+
+from django.db.models import Count, Max, Value
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from api import cache
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(
+        ':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _user_relations(user):
+    favorites, shopping_cart, subscriptions = (
+        model.objects.filter(user=user).values('user').annotate(
+            kind=Value(kind), count=Count('id'), last=Max('id')
+        ).values_list('kind', 'count', 'last')
+        for kind, model in enumerate((Favorite, ShoppingCart, Subscription))
+    )
+    return favorites.union(shopping_cart, subscriptions, all=True)
+
+
+def user_relations_state(user):
+    """Меняется при любом изменении избранного, корзины и подписок.
+
+    Пара (число строк, максимальный id) у таблицы с растущими id
+    не может вернуться к прежнему значению после вставки или удаления.
+    """
+    if not user.is_authenticated:
+        return ()
+    return tuple(sorted(_user_relations(user)))
+
+
+async def auser_relations_state(user):
+    if not user.is_authenticated:
+        return ()
+    return tuple(sorted([row async for row in _user_relations(user)]))
+
+
+def _version_time(version):
+    return datetime.fromtimestamp(version / 10 ** 9, tz=timezone.utc)
+
+
+def _recipes_validators(request, version, relations):
+    etag = make_etag(request.get_full_path(), version, *relations)
+    return etag, _version_time(version)
+
+
+def recipes_state(request):
+    """ETag и время изменения списка рецептов."""
+    return _recipes_validators(request, cache.global_version(),
+                               user_relations_state(request.user))
+
+
+async def arecipes_state(request):
+    return _recipes_validators(request, await cache.aglobal_version(),
+                               await auser_relations_state(request.user))
+
+
+RECIPE_STATE_FIELDS = ('updated_at', 'author__updated_at', 'is_favorited',
+                       'is_in_shopping_cart', 'author_is_subscribed')
+
+
+def recipe_validators(request, state, versions):
+    """ETag и время изменения рецепта.
+
+    ``state`` — значения ``RECIPE_STATE_FIELDS``, ``versions`` — из
+    ``cache.recipe_versions``.
+    """
+    etag = make_etag(request.get_full_path(), *state, *versions)
+    return etag, max(*state[:2], *map(_version_time, versions))
+
+
+def _precondition(request, etag, last_modified):
+    if request.user.is_authenticated:
+        last_modified = None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return timestamp, get_conditional_response(
+        request, etag=etag, last_modified=timestamp)
+
+
+def _set_validators(response, etag, timestamp):
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def evaluate(request, etag, last_modified, get_response):
+    """Отвечает 304 по совпавшему валидатору или вызывает ``get_response``.
+
+    ``last_modified`` учитывается только для анонимных запросов.
+    """
+    timestamp, response = _precondition(request, etag, last_modified)
+    if response is None:
+        response = get_response()
+    return _set_validators(response, etag, timestamp)
+
+
+async def aevaluate(request, etag, last_modified, get_response):
+    """``evaluate`` с корутиной ``get_response``."""
+    timestamp, response = _precondition(request, etag, last_modified)
+    if response is None:
+        response = await get_response()
+    return _set_validators(response, etag, timestamp)
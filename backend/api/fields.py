@@ -1,13 +1,25 @@
 import base64
+import binascii
+
 from django.core.files.base import ContentFile
 from rest_framework import serializers
-import imghdr
+
+from api.images import detect_extension, rendition_urls
 
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = imghdr.what(None, h=base64.b64decode(imgstr))
-            data = ContentFile(base64.b64decode(imgstr), name=f'temp.{ext}')
+            try:
+                _, imgstr = data.split(';base64,')
+                raw = base64.b64decode(imgstr)
+                ext = detect_extension(raw)
+            except (ValueError, binascii.Error):
+                self.fail('invalid_image')
+            data = ContentFile(raw, name=f'temp.{ext}')
         return super().to_internal_value(data)
+
+
+class RenditionsField(serializers.ReadOnlyField):
+    def to_representation(self, value):
+        return rendition_urls(value or {}, self.context.get('request'))
@@ -1,11 +1,17 @@
 from django_filters import rest_framework as filters
+from recipes import ranking
 from recipes.models import Recipe
+from recipes.search import search_recipes
 
 
 class RecipeFilter(filters.FilterSet):
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'Популярные'), ('trending', 'В тренде')),
+        method='filter_ordering')
 
     class Meta:
         model = Recipe
@@ -14,11 +20,19 @@ class RecipeFilter(filters.FilterSet):
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favorites__user=user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(shopping_carts__user=user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        if value.strip():
+            return search_recipes(queryset, value.strip())
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        return ranking.order_by(queryset, value)
@@ -0,0 +1,134 @@
+"""Приведение загруженных изображений и фоновая нарезка размеров.
+
+Для каждого размера из спецификации сохраняются WebP и JPEG, пути
+записываются в JSON-поле модели вместе с ``source`` — именем исходного
+файла. Нарезка выполняется фоновой задачей ``api.build_renditions``,
+а результат записывается, только если исходное изображение за это
+время не сменилось.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from jobs.queue import enqueue
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True,
+                      'progressive': True}),
+}
+EXTENSIONS = {'JPEG': 'jpg'}
+
+
+def detect_extension(raw):
+    """Определяет расширение по содержимому или бросает ``ValueError``."""
+    try:
+        with Image.open(BytesIO(raw)) as image:
+            image_format = image.format
+            image.verify()
+    except Exception as error:
+        raise ValueError('Не удалось распознать изображение.') from error
+    return EXTENSIONS.get(image_format, image_format.lower())
+
+
+def _to_rgb(image):
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_renditions(field_file, sizes):
+    stem = os.path.splitext(field_file.name)[0]
+    renditions = {'source': field_file.name}
+    with field_file.open('rb'), Image.open(field_file) as original:
+        image = _to_rgb(ImageOps.exif_transpose(original))
+    for name, size in sizes.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        for extension, (image_format, options) in RENDITION_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, image_format, **options)
+            path = default_storage.save(
+                f'renditions/{stem}_{name}.{extension}',
+                ContentFile(buffer.getvalue())
+            )
+            renditions.setdefault(name, {})[extension] = path
+    return renditions
+
+
+def rendition_paths(renditions):
+    return [
+        path
+        for name, formats in renditions.items() if name != 'source'
+        for path in formats.values()
+    ]
+
+
+def delete_renditions(renditions):
+    for path in rendition_paths(renditions):
+        default_storage.delete(path)
+
+
+def rendition_urls(renditions, request=None):
+    urls = {}
+    for name, formats in renditions.items():
+        if name == 'source':
+            continue
+        urls[name] = {
+            extension: (request.build_absolute_uri(default_storage.url(path))
+                        if request else default_storage.url(path))
+            for extension, path in formats.items()
+        }
+    return urls
+
+
+def build_renditions(model_label, pk, field_name, renditions_field, sizes,
+                     on_ready=None):
+    model = apps.get_model(model_label)
+    instance = model.objects.only(
+        'pk', field_name, renditions_field).get(pk=pk)
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        return
+    old_renditions = getattr(instance, renditions_field)
+    renditions = render_renditions(field_file, sizes)
+    updated = model.objects.filter(
+        pk=pk, **{field_name: field_file.name}
+    ).update(**{renditions_field: renditions, 'updated_at': timezone.now()})
+    if not updated:
+        delete_renditions(renditions)
+        return
+    delete_renditions(old_renditions)
+    if on_ready:
+        on_ready(pk)
+
+
+def sync_renditions(instance, field_name, renditions_field, sizes):
+    """Ставит нарезку в очередь, если изображение сменилось.
+
+    Для удалённого изображения сразу очищает старые размеры.
+    """
+    field_file = getattr(instance, field_name)
+    renditions = getattr(instance, renditions_field) or {}
+    model = type(instance)
+    if not field_file:
+        if renditions:
+            model.objects.filter(pk=instance.pk).update(
+                **{renditions_field: {}})
+            enqueue('api.delete_renditions', renditions)
+        return
+    if renditions.get('source') == field_file.name:
+        return
+    enqueue('api.build_renditions', model._meta.label, instance.pk,
+            field_name, renditions_field, sizes)
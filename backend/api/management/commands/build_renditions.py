@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from api import tasks
+from foodgram.constants import AVATAR_RENDITIONS, RECIPE_IMAGE_RENDITIONS
+from recipes.models import Recipe
+from users.models import User
+
+TARGETS = (
+    (Recipe, 'image', 'image_renditions', RECIPE_IMAGE_RENDITIONS),
+    (User, 'avatar', 'avatar_renditions', AVATAR_RENDITIONS),
+)
+
+
+class Command(BaseCommand):
+    help = 'Нарезает размеры фото рецептов и аватаров, которых ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать размеры для всех изображений'
+        )
+
+    def handle(self, *args, **options):
+        for model, field_name, renditions_field, sizes in TARGETS:
+            built = 0
+            queryset = model.objects.exclude(
+                **{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for pk, name, renditions in queryset.values_list(
+                    'pk', field_name, renditions_field).iterator():
+                if not options['force'] and (
+                        renditions or {}).get('source') == name:
+                    continue
+                try:
+                    tasks.build_renditions(model._meta.label, pk,
+                                           field_name, renditions_field,
+                                           sizes)
+                except Exception as error:
+                    self.stderr.write(
+                        f'{model._meta.verbose_name} #{pk}: {error}')
+                    continue
+                built += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: обработано {built}.'))
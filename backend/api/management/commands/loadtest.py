@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = (
+    '/api/recipes/?limit=20',
+    '/api/ingredients/?name=%D1%81%D0%BE',
+)
+
+
+class Connection:
+    """Одно keep-alive соединение HTTP/1.1 к серверу."""
+
+    def __init__(self, host, port, headers):
+        self.host = host
+        self.port = port
+        self.headers = headers
+        self.reader = self.writer = None
+
+    async def request(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port)
+        lines = [f'GET {path} HTTP/1.1', f'Host: {self.host}',
+                 *self.headers, '', '']
+        self.writer.write('\r\n'.join(lines).encode())
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            while size := int((await self.reader.readline()).strip(), 16):
+                await self.reader.readexactly(size + 2)
+            await self.reader.readline()
+        if headers.get('connection') == 'close':
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенные серверы GET-запросами и сравнивает '
+            'пропускную способность и хвосты задержек')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'targets', nargs='+', metavar='имя=URL',
+            help='Серверы, например wsgi=http://127.0.0.1:8001'
+        )
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Адрес для запросов, можно несколько раз'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=100,
+            help='Число одновременных соединений'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=20,
+            help='Длительность прогона каждого сервера, в секундах'
+        )
+        parser.add_argument(
+            '--warmup', type=float, default=2,
+            help='Прогрев перед замером, в секундах'
+        )
+        parser.add_argument(
+            '--token', help='Токен для заголовка Authorization'
+        )
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['targets']:
+            name, _, url = target.partition('=')
+            parts = urlsplit(url)
+            if not name or parts.scheme != 'http' or not parts.hostname:
+                raise CommandError(f'Ожидалось имя=http://хост:порт: {target}')
+            targets.append((name, parts.hostname, parts.port or 80))
+        headers = ['Connection: keep-alive', 'Accept: application/json']
+        if options['token']:
+            headers.append(f'Authorization: Token {options["token"]}')
+        paths = options['paths'] or DEFAULT_PATHS
+        rows = []
+        for name, host, port in targets:
+            self.stdout.write(f'{name}: {host}:{port}…')
+            asyncio.run(self.run(host, port, headers, paths,
+                                 options['concurrency'], options['warmup']))
+            latencies, errors, elapsed = asyncio.run(self.run(
+                host, port, headers, paths, options['concurrency'],
+                options['duration']))
+            rows.append((name, latencies, errors, elapsed))
+        self.report(rows)
+
+    async def run(self, host, port, headers, paths, concurrency, duration):
+        latencies = []
+        errors = 0
+        deadline = time.monotonic() + duration
+        requests = itertools.cycle(paths)
+
+        async def worker():
+            nonlocal errors
+            connection = Connection(host, port, headers)
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    status = await connection.request(next(requests))
+                except (OSError, ValueError, IndexError,
+                        asyncio.IncompleteReadError):
+                    connection.close()
+                    errors += 1
+                    continue
+                if status >= 400:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+            connection.close()
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, errors, time.monotonic() - started
+
+    def report(self, rows):
+        self.stdout.write(
+            f'{"сервер":<10}{"запросы":>10}{"ошибки":>8}{"в сек.":>10}'
+            f'{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}{"max, мс":>10}')
+        for name, latencies, errors, elapsed in rows:
+            if len(latencies) < 2:
+                self.stdout.write(f'{name:<10}нет ответов')
+                continue
+            quantiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f'{name:<10}{len(latencies):>10}{errors:>8}'
+                f'{len(latencies) / elapsed:>10.0f}'
+                f'{quantiles[49] * 1000:>10.1f}'
+                f'{quantiles[94] * 1000:>10.1f}'
+                f'{quantiles[98] * 1000:>10.1f}'
+                f'{max(latencies) * 1000:>10.1f}')
@@ -0,0 +1,154 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Постраничный вывод по ключу ``ordering`` без OFFSET и COUNT.
+
+    Курсор хранит значения полей сортировки последнего элемента страницы,
+    следующая страница выбирается условием «строго после курсора»,
+    которое покрывается составным индексом по тем же полям.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    max_limit = 100
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+
+    def get_limit(self, request):
+        limit = request.query_params.get(self.limit_query_param, '')
+        if limit.isdigit() and int(limit) > 0:
+            return min(int(limit), self.max_limit)
+        return settings.REST_FRAMEWORK['PAGE_SIZE']
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, item):
+        values = [getattr(item, field) for field in self.fields]
+        raw = json.dumps(values, cls=JSONEncoder)
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def after_cursor(self, values):
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(
+                **dict(zip(self.fields[:i], values[:i])),
+                **{f'{self.fields[i]}__{lookup}': values[i]}
+            )
+        return condition
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        self.limit = self.get_limit(request)
+        queryset = queryset.order_by(*self.ordering)
+        values = self.decode_cursor(request, queryset.model)
+        if values is not None:
+            queryset = queryset.filter(self.after_cursor(values))
+        return queryset[:self.limit + 1]
+
+    def _cut_page(self, page):
+        limit = self.limit
+        self.next_item = page[limit - 1] if len(page) > limit else None
+        return page[:limit]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._cut_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        return self._cut_page(
+            [item async for item in self._page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if self.next_item is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(self.next_item)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True,
+                         'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class KeysetOptInMixin:
+    """Включает ``KeysetPagination`` по ``?pagination=cursor``.
+
+    Без параметра вьюсет остаётся на пагинаторе из настроек; действия
+    из ``keyset_actions`` всегда отдаются по курсору.
+    """
+    keyset_ordering = None
+    keyset_actions = ()
+    pagination_query_param = 'pagination'
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def uses_keyset_pagination(self):
+        params = self.request.query_params
+        return (
+            self.action in self.keyset_actions
+            or params.get(self.pagination_query_param) == 'cursor'
+            or KeysetPagination.cursor_query_param in params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if not self.uses_keyset_pagination():
+                return super().paginator
+            self._paginator = KeysetPagination(self.get_keyset_ordering())
+        return self._paginator
+
+
+async def apaginate_queryset(paginator, queryset, request):
+    """Асинхронный ``paginate_queryset`` для пагинаторов проекта."""
+    if isinstance(paginator, KeysetPagination):
+        return await paginator.apaginate_queryset(queryset, request)
+    if not isinstance(paginator, LimitOffsetPagination):
+        raise TypeError(f'Пагинатор {paginator!r} не поддерживается.')
+    paginator.request = request
+    paginator.limit = paginator.get_limit(request)
+    if paginator.limit is None:
+        return None
+    paginator.count = await queryset.acount()
+    paginator.offset = paginator.get_offset(request)
+    if paginator.count == 0 or paginator.offset > paginator.count:
+        return []
+    return [item async for item in queryset[
+        paginator.offset:paginator.offset + paginator.limit]]
@@ -0,0 +1,159 @@
+"""Выборочное профилирование запросов к API.
+
+``ProfilingMiddleware`` профилирует долю ``PROFILING_SAMPLE_RATE``
+запросов к ``/api/``: считает SQL-запросы и их время, ищет повторы
+по отпечатку запроса и меряет время сериализации
+(``ProfiledSerializerMixin``, вложенные сериализаторы и их SQL входят
+во время внешнего). Итог уходит в заголовок ``Server-Timing``, а
+запросы медленнее ``PROFILING_SLOW_MS`` попадают в кольцевой буфер
+процесса, который отдаёт ``/api/profiling/slow-requests/``.
+Непрофилированные запросы платят только за вызов ``random()``.
+"""
+import random
+import re
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils import timezone
+
+from metrics.queries import observe_queries
+
+DUPLICATES_LIMIT = 5
+
+_current = ContextVar('profile', default=None)
+slow_requests = deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+
+_placeholders = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def fingerprint(sql):
+    """Приводит запросы, различающиеся только значениями, к одному виду."""
+    return _placeholders.sub('(...)', _literals.sub('?', sql))
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = Counter()
+        self.sql_time = 0.0
+        self.spans = Counter()
+        self.active = set()
+
+    def record_query(self, sql, duration):
+        self.sql_time += duration
+        self.queries[fingerprint(sql)] += 1
+
+    @contextmanager
+    def span(self, name):
+        if name in self.active:
+            yield
+            return
+        self.active.add(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] += time.perf_counter() - start
+            self.active.discard(name)
+
+    def duplicates(self):
+        return [
+            {'sql': sql, 'count': count}
+            for sql, count in self.queries.most_common(DUPLICATES_LIMIT)
+            if count > 1
+        ]
+
+    def server_timing(self, total):
+        duplicates = sum(
+            count - 1 for count in self.queries.values() if count > 1)
+        metrics = [
+            f'sql;dur={self.sql_time * 1000:.1f};'
+            f'desc="{sum(self.queries.values())} queries, '
+            f'{duplicates} duplicates"',
+            *(f'{name};dur={duration * 1000:.1f}'
+              for name, duration in self.spans.items()),
+            f'total;dur={total * 1000:.1f}',
+        ]
+        return ', '.join(metrics)
+
+
+@contextmanager
+def span(name):
+    """Засчитывает время блока в метрику ``name`` текущего профиля."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    with profile.span(name):
+        yield
+
+
+class ProfiledSerializerMixin:
+    def to_representation(self, instance):
+        with span('serialize'):
+            return super().to_representation(instance)
+
+
+@contextmanager
+def profiling():
+    profile = Profile()
+    token = _current.set(profile)
+    try:
+        with observe_queries(profile.record_query):
+            yield profile
+    finally:
+        _current.reset(token)
+
+
+def is_sampled(request):
+    return (request.path.startswith('/api/')
+            and random.random() < settings.PROFILING_SAMPLE_RATE)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not is_sampled(request):
+            return self.get_response(request)
+        with profiling() as profile:
+            response = self.get_response(request)
+        return self.report(request, response, profile)
+
+    async def __acall__(self, request):
+        if not is_sampled(request):
+            return await self.get_response(request)
+        with profiling() as profile:
+            response = await self.get_response(request)
+        return self.report(request, response, profile)
+
+    def report(self, request, response, profile):
+        total = time.perf_counter() - profile.started
+        response['Server-Timing'] = profile.server_timing(total)
+        if total * 1000 >= settings.PROFILING_SLOW_MS:
+            slow_requests.append({
+                'time': timezone.now().isoformat(),
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 1),
+                'sql_ms': round(profile.sql_time * 1000, 1),
+                'sql_count': sum(profile.queries.values()),
+                'spans_ms': {name: round(duration * 1000, 1)
+                             for name, duration in profile.spans.items()},
+                'duplicates': profile.duplicates(),
+            })
+        return response
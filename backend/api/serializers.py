@@ -1,12 +1,16 @@
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from djoser.serializers import UserSerializer
 
-from api.fields import Base64ImageField
+from api.fields import Base64ImageField, RenditionsField
+from api.profiling import ProfiledSerializerMixin
 from foodgram.constants import (RECIPE_MIN_COOKING_TIME,
                                 RECIPE_MAX_COOKING_TIME,
                                 INGREDIENT_MIN_AMOUNT,
-                                INGREDIENT_MAX_AMOUNT)
+                                INGREDIENT_MAX_AMOUNT,
+                                BULK_RECIPES_MAX_LENGTH)
+from recipes import shopping_list
 from recipes.models import (
     Ingredient, Recipe, RecipeIngredient,
     Favorite, ShoppingCart
@@ -14,33 +18,37 @@ from recipes.models import (
 from users.models import User, Subscription
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(ProfiledSerializerMixin, UserSerializer):
     avatar = Base64ImageField()
+    avatar_renditions = RenditionsField()
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = UserSerializer.Meta.fields + (
-            'is_subscribed', 'avatar')
+            'is_subscribed', 'avatar', 'avatar_renditions')
 
     def get_is_subscribed(self, obj):
+        annotated = getattr(obj, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
         request = self.context.get('request')
         return (
                 request
                 and request.user.is_authenticated
-                and obj.subscriptions.filter(user=request.user).exists()
+                and obj.subscribers.filter(user=request.user).exists()
         )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(ProfiledSerializerMixin,
+                           serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all())
+    id = serializers.IntegerField(source='ingredient_id', min_value=1)
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit')
@@ -53,33 +61,59 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(ProfiledSerializerMixin,
+                           serializers.ModelSerializer):
     author = CustomUserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
         many=True, source='recipeingredient_set', read_only=True
     )
     image = Base64ImageField()
+    image_renditions = RenditionsField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'author', 'name', 'image',
+            'id', 'author', 'name', 'image', 'image_renditions',
             'text', 'cooking_time', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
         )
 
-    def _check_user_relation(self, related_manager):
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
+    def _check_user_relation(self, obj, annotation, related_manager):
+        annotated = getattr(obj, annotation, None)
+        if annotated is not None:
+            return annotated
         user = self.context.get('request').user
         return (user.is_authenticated and
                 related_manager.filter(user=user).exists())
 
     def get_is_favorited(self, obj):
-        return self._check_user_relation(obj.favorites)
+        return self._check_user_relation(
+            obj, 'is_favorited', obj.favorites)
 
     def get_is_in_shopping_cart(self, obj):
-        return self._check_user_relation(obj.shopping_carts)
+        return self._check_user_relation(
+            obj, 'is_in_shopping_cart', obj.shopping_carts)
+
+
+class RecipeDetailSerializer(RecipeReadSerializer):
+    """Рецепт со счётчиками для ``retrieve``.
+
+    Кэш и ETag рецепта сбрасывает его версия, которую меняет каждая связь
+    с рецептом. Списки кэшируются по общей версии, поэтому счётчиков в них
+    нет: иначе любое добавление в избранное сбрасывало бы все списки.
+    """
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + (
+            'favorites_count', 'shopping_cart_count',
+        )
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
@@ -112,40 +146,90 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
         return data
 
+    def validate_ingredients(self, ingredients):
+        ingredient_ids = {item['ingredient_id'] for item in ingredients}
+        missing = ingredient_ids - set(Ingredient.objects.filter(
+            pk__in=ingredient_ids).values_list('pk', flat=True))
+        if missing:
+            raise ValidationError(
+                'Ингредиенты не найдены: '
+                f'{", ".join(map(str, sorted(missing)))}.'
+            )
+        return ingredients
+
     def create_ingredients(self, recipe, ingredients):
         RecipeIngredient.objects.bulk_create(
             RecipeIngredient(
                 recipe=recipe,
-                ingredient=item['id'],
+                ingredient_id=item['ingredient_id'],
                 amount=item['amount']
             )
             for item in ingredients
         )
 
+    def update_ingredients(self, recipe, ingredients):
+        """Приводит ингредиенты рецепта к новому списку по разнице.
+
+        Возвращает ``{ingredient_id: amount}`` до изменения.
+        """
+        old_rows = {
+            ingredient_id: (pk, amount)
+            for pk, ingredient_id, amount in recipe.recipeingredient_set
+            .values_list('pk', 'ingredient_id', 'amount')
+        }
+        new_amounts = {
+            item['ingredient_id']: item['amount'] for item in ingredients
+        }
+        removed = [pk for ingredient_id, (pk, _) in old_rows.items()
+                   if ingredient_id not in new_amounts]
+        changed = [
+            RecipeIngredient(pk=old_rows[ingredient_id][0], amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id in old_rows
+            and old_rows[ingredient_id][1] != amount
+        ]
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        self.create_ingredients(recipe, [
+            item for item in ingredients
+            if item['ingredient_id'] not in old_rows
+        ])
+        return {
+            ingredient_id: amount
+            for ingredient_id, (_, amount) in old_rows.items()
+        }
+
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         self.create_ingredients(recipe, ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         instance = super().update(instance, validated_data)
-        instance.recipeingredient_set.all().delete()
-        self.create_ingredients(instance, ingredients)
+        with shopping_list.manual():
+            old_amounts = self.update_ingredients(instance, ingredients)
+        shopping_list.update_recipe(instance, old_amounts)
         return instance
 
     def to_representation(self, instance):
         return RecipeReadSerializer(instance, context=self.context).data
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
+class RecipeShortSerializer(ProfiledSerializerMixin,
+                            serializers.ModelSerializer):
+    image_renditions = RenditionsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
-class AvatarSerializer(serializers.ModelSerializer):
+class AvatarSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     avatar = Base64ImageField()
 
     class Meta:
@@ -155,20 +239,22 @@ class AvatarSerializer(serializers.ModelSerializer):
 
 class SubscriptionSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='recipes.count')
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
         fields = CustomUserSerializer.Meta.fields + (
-            'recipes', 'recipes_count',
+            'recipes', 'recipes_count', 'subscribers_count',
         )
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.query_params.get('recipes_limit')
-        queryset = obj.recipes.all()
-        if limit and limit.isdigit():
-            queryset = queryset[:int(limit)]
+        queryset = getattr(obj, 'recipes_preview', None)
+        if queryset is None:
+            request = self.context.get('request')
+            limit = request.query_params.get('recipes_limit')
+            queryset = obj.recipes.all()
+            if limit and limit.isdigit():
+                queryset = queryset[:int(limit)]
         return RecipeShortSerializer(queryset, many=True,
                                      context=self.context).data
 
@@ -227,3 +313,10 @@ class FavoriteSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         return RecipeShortSerializer(instance.recipe,
                                      context=self.context).data
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=BULK_RECIPES_MAX_LENGTH
+    )
@@ -0,0 +1,93 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api import cache, images
+from api.authentication import tokens
+from foodgram.constants import AVATAR_RENDITIONS, RECIPE_IMAGE_RENDITIONS
+from recipes.counters import counters_changed
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart)
+from recipes.ranking import scores_refreshed
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    transaction.on_commit(partial(cache.bump_recipe_version, instance.pk))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(cache.bump_recipe_version, instance.recipe_id))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_recipe_relations(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        cache.bump_recipe_version, instance.recipe_id, bump_global=False))
+
+
+@receiver((post_save, post_delete), sender=User)
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_all_recipes(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(cache.bump_global_version)
+
+
+def _invalidate_now_and_on_commit(func, *args):
+    # Сразу — чтобы текущий процесс не отдал старую запись, после
+    # коммита — чтобы не осталась запись, прочитанная до него.
+    func(*args)
+    transaction.on_commit(partial(func, *args))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    _invalidate_now_and_on_commit(tokens.invalidate, instance.key)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user_tokens(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    _invalidate_now_and_on_commit(tokens.invalidate_user, instance.pk)
+
+
+@receiver(counters_changed, sender=Recipe)
+def invalidate_counted_recipes(sender, pks, **kwargs):
+    # Пакетные связи идут мимо сигналов Favorite и ShoppingCart.
+    transaction.on_commit(partial(cache.bump_recipe_versions, pks))
+
+
+@receiver(counters_changed, sender=User)
+def invalidate_counted_users(sender, pks, **kwargs):
+    for pk in pks:
+        _invalidate_now_and_on_commit(tokens.invalidate_user, pk)
+
+
+@receiver(scores_refreshed)
+def invalidate_rankings(sender, **kwargs):
+    transaction.on_commit(cache.bump_global_version)
+
+
+@receiver(post_save, sender=Recipe)
+def sync_recipe_image_renditions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        images.sync_renditions(
+            instance, 'image', 'image_renditions', RECIPE_IMAGE_RENDITIONS)
+
+
+@receiver(post_save, sender=User)
+def sync_avatar_renditions(sender, instance, raw=False, update_fields=None,
+                           **kwargs):
+    if raw or (update_fields and 'avatar' not in update_fields):
+        return
+    images.sync_renditions(
+        instance, 'avatar', 'avatar_renditions', AVATAR_RENDITIONS)
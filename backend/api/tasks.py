@@ -0,0 +1,28 @@
+from api import cache, images
+from api.authentication import tokens
+from jobs.queue import task
+
+
+def _avatar_ready(pk):
+    # Нарезка пишется через update() без сигналов: сбрасываем то же, что
+    # сигналы при сохранении пользователя, иначе кэш токенов и ETag
+    # ``users/me`` отдают старые адреса аватара.
+    cache.bump_global_version()
+    tokens.invalidate_user(pk)
+
+
+RENDITIONS_READY = {
+    'recipes.Recipe': cache.bump_recipe_version,
+    'users.User': _avatar_ready,
+}
+
+
+@task('api.build_renditions')
+def build_renditions(model_label, pk, field_name, renditions_field, sizes):
+    images.build_renditions(model_label, pk, field_name, renditions_field,
+                            sizes, on_ready=RENDITIONS_READY.get(model_label))
+
+
+@task('api.delete_renditions')
+def delete_renditions(renditions):
+    images.delete_renditions(renditions)
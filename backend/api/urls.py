@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework import routers
-from .views import RecipeViewSet, IngredientViewSet, UserViewSet
+from .views import (RecipeViewSet, IngredientViewSet, UserViewSet,
+                    SlowRequestsView)
 
 router = routers.DefaultRouter()
 router.register("recipes", RecipeViewSet, basename="recipes")
@@ -10,4 +11,6 @@ router.register("users", UserViewSet, basename="users")
 urlpatterns = [
     path("", include(router.urls)),
     path("auth/", include("djoser.urls.authtoken")),
+    path("profiling/slow-requests/", SlowRequestsView.as_view(),
+         name="slow-requests"),
 ]
@@ -1,37 +1,117 @@
-from django.db.models import Sum
-from django.http import FileResponse
-from io import BytesIO
-from recipes.models import RecipeIngredient
+import csv
+import json
+
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
+from recipes.models import Recipe, ShoppingListIngredient
+
+SHOPPING_LIST_CHUNK_SIZE = 500
 
 
 def get_shopping_list_ingredients(user):
     return (
-        RecipeIngredient.objects
-        .filter(recipe__shopping_carts__user=user)
-        .values('ingredient__name', 'ingredient__measurement_unit')
-        .annotate(total_amount=Sum('amount'))
+        ShoppingListIngredient.objects
+        .filter(user=user, total_amount__gt=0)
+        .values('ingredient__name', 'ingredient__measurement_unit',
+                'total_amount')
         .order_by('ingredient__name')
     )
 
 
-def render_shopping_list_text(ingredients):
-    return '\n'.join(
-        f'{item["ingredient__name"]} — {item["total_amount"]} {item["ingredient__measurement_unit"]}'
-        for item in ingredients
-    )
+def iter_shopping_list_rows(user):
+    for item in get_shopping_list_ingredients(user).iterator(
+            chunk_size=SHOPPING_LIST_CHUNK_SIZE):
+        yield (item['ingredient__name'],
+               item['ingredient__measurement_unit'],
+               item['total_amount'])
+
+
+def render_shopping_list_text(rows):
+    for name, measurement_unit, amount in rows:
+        yield f'{name} — {amount} {measurement_unit}\n'
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def render_shopping_list_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_shopping_list_json(rows):
+    yield '['
+    for i, (name, measurement_unit, amount) in enumerate(rows):
+        item = json.dumps(
+            {'name': name, 'measurement_unit': measurement_unit,
+             'amount': amount},
+            ensure_ascii=False
+        )
+        yield f',{item}' if i else item
+    yield ']'
 
 
-def generate_shopping_list_file(user):
-    ingredients = get_shopping_list_ingredients(user)
-    content = render_shopping_list_text(ingredients)
+SHOPPING_LIST_RENDERERS = {
+    'txt': (render_shopping_list_text, 'text/plain'),
+    'csv': (render_shopping_list_csv, 'text/csv'),
+    'json': (render_shopping_list_json, 'application/json'),
+}
 
-    buffer = BytesIO()
-    buffer.write(content.encode('utf-8'))
-    buffer.seek(0)
 
-    return FileResponse(
-        buffer,
-        as_attachment=True,
-        filename='shopping_list.txt',
-        content_type='text/plain'
+def generate_shopping_list_file(user, file_format='txt'):
+    render, content_type = SHOPPING_LIST_RENDERERS[file_format]
+    response = StreamingHttpResponse(
+        (chunk.encode('utf-8')
+         for chunk in render(iter_shopping_list_rows(user))),
+        content_type=f'{content_type}; charset=utf-8'
     )
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_list.{file_format}"')
+    return response
+
+
+def recipes_limit(request):
+    limit = request.query_params.get('recipes_limit', '')
+    return int(limit) if limit.isdigit() else None
+
+
+def _preview_recipes(authors, limit):
+    recipes = Recipe.objects.filter(author__in=authors).only(
+        'id', 'author_id', 'name', 'image', 'image_renditions',
+        'cooking_time', 'pub_date')
+    if limit is not None:
+        recipes = recipes.annotate(row_number=Window(
+            RowNumber(),
+            partition_by=F('author'),
+            order_by=(F('pub_date').desc(), F('id').desc()),
+        )).filter(row_number__lte=limit)
+    return recipes.order_by('author_id', '-pub_date', '-id')
+
+
+def _attach_preview(authors, recipes):
+    by_author = defaultdict(list)
+    for recipe in recipes:
+        by_author[recipe.author_id].append(recipe)
+    for author in authors:
+        author.recipes_preview = by_author[author.pk]
+    return authors
+
+
+def attach_recipes_preview(authors, limit=None):
+    """Загружает первые ``limit`` рецептов всех авторов одним запросом.
+
+    Рецепты складываются в ``author.recipes_preview``.
+    """
+    return _attach_preview(authors, _preview_recipes(authors, limit))
+
+
+async def aattach_recipes_preview(authors, limit=None):
+    return _attach_preview(authors, [
+        recipe async for recipe in _preview_recipes(authors, limit)])
@@ -1,14 +1,23 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Value
 from django.urls import reverse
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from api import cache, conditional, profiling
 from api.filters import RecipeFilter
+from api.pagination import KeysetOptInMixin
 from api.permissions import IsAuthorOrReadOnly
+from api.renderers import CSVRenderer, PlainTextRenderer
 from api.serializers import (RecipeReadSerializer,
+                                     RecipeDetailSerializer,
                                      RecipeWriteSerializer,
                                      IngredientSerializer,
                                      CustomUserSerializer,
@@ -16,88 +25,266 @@ from api.serializers import (RecipeReadSerializer,
                                      SubscriptionCreateSerializer,
                                      AvatarSerializer,
                                      FavoriteSerializer,
-                                     ShoppingCartSerializer
+                                     ShoppingCartSerializer,
+                                     RecipeIdsSerializer
                                      )
-from api.utils import generate_shopping_list_file
-from recipes.models import (Recipe, Ingredient,
+from api.utils import (attach_recipes_preview, generate_shopping_list_file,
+                       recipes_limit)
+from foodgram.db_router import ReplicaReadsMixin
+from recipes import counters, feed, ranking, relations
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Recipe, Ingredient, RecipeIngredient,
                                     Favorite, ShoppingCart)
 from users.models import User, Subscription
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReplicaReadsMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
 
-    def get_queryset(self):
-        name = self.request.query_params.get('name')
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
         if name:
-            return self.queryset.filter(name__istartswith=name)
-        return self.queryset
+            return Response(ingredient_index.search(name))
+        return Response(ingredient_index.all())
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeViewSet(ReplicaReadsMixin, KeysetOptInMixin,
+                    viewsets.ModelViewSet):
+    queryset = Recipe.objects.defer('search_vector')
     permission_classes = [IsAuthorOrReadOnly]
     filterset_class = RecipeFilter
+    keyset_ordering = ('-pub_date', '-id')
+    keyset_actions = ('feed',)
+
+    def get_keyset_ordering(self):
+        if self.request.query_params.get('search', '').strip():
+            # Порядок поиска задаёт ранг, которого нет в ключе курсора.
+            raise ValidationError(
+                {'search': 'Поиск не поддерживает вывод по курсору.'})
+        if self.uses_feed_entries():
+            return feed.ENTRY_ORDERING
+        return ranking.ORDERINGS.get(
+            self.request.query_params.get('ordering'), self.keyset_ordering)
+
+    def get_queryset(self):
+        return self.prefetch_ingredients(self.get_annotated_queryset())
+
+    def uses_feed_entries(self):
+        return (self.action == 'feed' and feed.uses_fan_out()
+                and 'ordering' not in self.request.query_params)
+
+    @staticmethod
+    def prefetch_ingredients(queryset):
+        return queryset.prefetch_related(
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+
+    def get_annotated_queryset(self):
+        queryset = self.queryset.select_related('author')
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_is_subscribed=Value(False),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = conditional.recipes_state(request)
+        return conditional.evaluate(
+            request, etag, last_modified,
+            lambda: self._cached_list(request, *args, **kwargs))
+
+    def _cached_list(self, request, *args, **kwargs):
+        if not cache.is_cacheable(request):
+            return super().list(request, *args, **kwargs)
+        return self._cached(cache.list_key(request), super().list,
+                            request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        def get_response():
+            return self._cached(cache.detail_key(request, kwargs['pk']),
+                                super(RecipeViewSet, self).retrieve,
+                                request, *args, **kwargs)
+
+        try:
+            state = self.get_annotated_queryset().filter(
+                pk=kwargs['pk']).values_list(
+                *conditional.RECIPE_STATE_FIELDS).first()
+        except (TypeError, ValueError):
+            state = None
+        if state is None:
+            return get_response()
+        return conditional.evaluate(
+            request, *conditional.recipe_validators(
+                request, state, cache.recipe_versions(kwargs['pk'])),
+            get_response)
+
+    def _cached(self, key, view, request, *args, **kwargs):
+        data = cache.get_response_data(key)
+        if data is None:
+            response = view(request, *args, **kwargs)
+            cache.store_response_data(key, response.data)
+            return response
+        return Response(cache.personalize(data, request.user))
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return RecipeWriteSerializer
+        if self.action == 'retrieve':
+            return RecipeDetailSerializer
         return RecipeReadSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        counters.change('recipes_count', self.request.user.pk, 1)
 
-    def _add_to(self, request, pk, serializer_class):
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        counters.change('recipes_count', instance.author_id, -1)
+
+    def _add_to(self, request, pk, serializer_class, counter):
         recipe = get_object_or_404(Recipe, pk=pk)
-        serializer = serializer_class(
-            data={'user': request.user.id, 'recipe': recipe.id},
-            context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            relations.lock_user(request.user)
+            serializer = serializer_class(
+                data={'user': request.user.id, 'recipe': recipe.id},
+                context={'request': request}
+            )
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            counters.change(counter, recipe.pk, 1)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    def _remove_from(self, request, pk, model):
+    def _remove_from(self, request, pk, model, counter):
         recipe = get_object_or_404(Recipe, pk=pk)
-        deleted_count, _ = model.objects.filter(user=request.user, recipe=recipe).delete()
+        with transaction.atomic():
+            relations.lock_user(request.user)
+            deleted_count, _ = model.objects.filter(
+                user=request.user, recipe=recipe).delete()
+            if deleted_count > 0:
+                counters.change(counter, recipe.pk, -1)
         if deleted_count > 0:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'errors': 'Рецепт не найден в списке.'},
                         status=status.HTTP_400_BAD_REQUEST)
 
+    def _bulk(self, request, handler, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': handler(
+            model, request.user, serializer.validated_data['ids'])})
+
+    @action(detail=False, methods=['post'], url_path='favorite/bulk',
+            permission_classes=[IsAuthenticated])
+    def add_favorites(self, request):
+        return self._bulk(request, relations.add_recipes, Favorite)
+
+    @add_favorites.mapping.delete
+    def delete_favorites(self, request):
+        return self._bulk(request, relations.remove_recipes, Favorite)
+
+    @action(detail=False, methods=['post'], url_path='shopping_cart/bulk',
+            permission_classes=[IsAuthenticated])
+    def add_shopping_cart_items(self, request):
+        return self._bulk(request, relations.add_recipes, ShoppingCart)
+
+    @add_shopping_cart_items.mapping.delete
+    def delete_shopping_cart_items(self, request):
+        return self._bulk(request, relations.remove_recipes, ShoppingCart)
+
+    @action(detail=False, methods=['delete'], url_path='shopping_cart',
+            permission_classes=[IsAuthenticated])
+    def clear_shopping_cart(self, request):
+        return Response({'results': relations.remove_recipes(
+            ShoppingCart, request.user)})
+
     @action(detail=True, methods=['post'], url_path='favorite')
     def add_favorite(self, request, pk):
-        return self._add_to(request, pk, FavoriteSerializer)
+        return self._add_to(request, pk, FavoriteSerializer,
+                            'favorites_count')
 
     @add_favorite.mapping.delete
     def delete_favorite(self, request, pk):
-        return self._remove_from(request, pk, Favorite)
+        return self._remove_from(request, pk, Favorite, 'favorites_count')
 
     @action(detail=True, methods=['post'], url_path='shopping_cart')
     def add_shopping_cart(self, request, pk):
-        return self._add_to(request, pk, ShoppingCartSerializer)
+        return self._add_to(request, pk, ShoppingCartSerializer,
+                            'shopping_cart_count')
 
     @add_shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk):
-        return self._remove_from(request, pk, ShoppingCart)
+        return self._remove_from(request, pk, ShoppingCart,
+                                 'shopping_cart_count')
 
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        recipes = self.filter_queryset(self.get_queryset())
+        if not self.uses_feed_entries():
+            page = self.paginate_queryset(
+                feed.filter_feed(recipes, request.user))
+        else:
+            filtered = any(request.query_params.get(name)
+                           for name in self.filterset_class.base_filters)
+            entries = self.paginate_queryset(feed.feed_entries(
+                request.user, recipes if filtered else None))
+            page = feed.load_recipes(entries, recipes)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer])
     def download_shopping_cart(self, request):
-        return generate_shopping_list_file(request.user)
+        return generate_shopping_list_file(
+            request.user, request.accepted_renderer.format)
 
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_short_link(self, request, pk=None):
-        path = reverse('recipes:recipe_short_link', kwargs={'pk': pk})
+        recipe = get_object_or_404(Recipe.objects.only('short_code'), pk=pk)
+        path = reverse('recipes:recipe_short_link',
+                       kwargs={'code': recipe.short_code})
         url = request.build_absolute_uri(path)
         return Response(data={"short-link": url})
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(ReplicaReadsMixin, KeysetOptInMixin, DjoserUserViewSet):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
+    keyset_ordering = ('username', 'id')
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            state = self.get_queryset().filter(pk=kwargs['id']).annotate(
+                is_subscribed=Exists(Subscription.objects.filter(
+                    user=request.user.pk, author=OuterRef('pk')))
+            ).values_list('updated_at', 'is_subscribed').first()
+        except (TypeError, ValueError):
+            state = None
+        if state is None:
+            return super().retrieve(request, *args, **kwargs)
+        return conditional.evaluate(
+            request, conditional.make_etag(request.get_full_path(), *state),
+            state[0],
+            lambda: super(UserViewSet, self).retrieve(
+                request, *args, **kwargs))
 
     def _subscribe(self, request, id):
         author = get_object_or_404(User, pk=id)
@@ -106,18 +293,29 @@ class UserViewSet(DjoserUserViewSet):
             context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            subscription = serializer.save()
+            counters.change('subscribers_count', author.pk, 1)
+            subscription.author.refresh_from_db(fields=['subscribers_count'])
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def _unsubscribe(self, request, id):
         author = get_object_or_404(User, pk=id)
-        deleted_count, _ = Subscription.objects.filter(user=request.user,
-                                                   author=author).delete()
+        with transaction.atomic():
+            deleted_count, _ = Subscription.objects.filter(
+                user=request.user, author=author).delete()
+            if deleted_count > 0:
+                counters.change('subscribers_count', author.pk, -1)
         if deleted_count > 0:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'error': 'Подписка не найдена.'},
                         status=status.HTTP_400_BAD_REQUEST)
 
+    def get_subscribed_authors(self):
+        return User.objects.filter(
+            subscribers__user=self.request.user
+        ).annotate(is_subscribed=Value(True))
+
     @action(detail=True, methods=['post'],
             permission_classes=[IsAuthenticated], url_path='subscribe')
     def subscribe(self, request, id=None):
@@ -130,9 +328,8 @@ class UserViewSet(DjoserUserViewSet):
     @action(detail=False, permission_classes=[IsAuthenticated],
             url_path='subscriptions')
     def subscriptions(self, request):
-        authors = User.objects.filter(subscriptions__user=request.user)
-
-        page = self.paginate_queryset(authors)
+        page = self.paginate_queryset(self.get_subscribed_authors())
+        attach_recipes_preview(page, recipes_limit(request))
         serializer = SubscriptionSerializer(
                 page, many=True, context={'request': request})
         return self.get_paginated_response(serializer.data)
@@ -143,9 +340,17 @@ class UserViewSet(DjoserUserViewSet):
         url_path='me'
     )
     def me(self, request):
-        serializer = CustomUserSerializer(request.user,
-                                          context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        user = request.user
+        return conditional.evaluate(
+            request,
+            conditional.make_etag(request.get_full_path(), user.pk,
+                                  user.updated_at),
+            user.updated_at,
+            lambda: Response(
+                CustomUserSerializer(user, context={'request': request}).data,
+                status=status.HTTP_200_OK
+            )
+        )
 
     @action(detail=False, methods=['put', 'delete'],
             permission_classes=[IsAuthenticated], url_path='me/avatar')
@@ -159,3 +364,11 @@ class UserViewSet(DjoserUserViewSet):
             return Response(serializer.data)
         user.avatar.delete(save=True)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SlowRequestsView(APIView):
+    """Медленные запросы из буфера профилировщика этого процесса."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(list(reversed(profiling.slow_requests)))
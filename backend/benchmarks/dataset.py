@@ -0,0 +1,130 @@
+"""Сид-набор данных для бенчмарков API."""
+from rest_framework.authtoken.models import Token
+
+from recipes import counters, feed, ranking, shopping_list
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart)
+from users.models import Subscription, User
+
+AUTHORS_COUNT = 20
+RECIPES_PER_AUTHOR = 5
+INGREDIENTS_COUNT = 200
+INGREDIENTS_PER_RECIPE = 8
+SUBSCRIPTIONS_COUNT = 15
+FAVORITES_COUNT = 20
+SHOPPING_CART_COUNT = 25
+
+FEED_AUTHORS_COUNT = 100
+FEED_RECIPES_PER_AUTHOR = 20
+FEED_FOLLOWERS_COUNT = 1000
+
+# Однопиксельный PNG для запросов на создание и изменение рецептов.
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAAC'
+    'klEQVR4nGMAAQAABQABDQottAAAAABJRU5ErkJggg=='
+)
+
+
+def seed_dataset():
+    """Создаёт пользователей, рецепты и связи между ними.
+
+    Возвращает словарь с главным пользователем ``reader``, его токеном,
+    авторами и рецептами.
+    """
+    reader = User.objects.create_user(
+        email='reader@foodgram.ru', username='reader',
+        first_name='Читатель', last_name='Бенчмарков',
+        password='benchmark-password'
+    )
+    token = Token.objects.create(user=reader)
+    authors = User.objects.bulk_create(
+        User(email=f'author{i}@foodgram.ru', username=f'author{i}',
+             first_name='Автор', last_name=str(i))
+        for i in range(AUTHORS_COUNT)
+    )
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'ингредиент {i:03}', measurement_unit='г')
+        for i in range(INGREDIENTS_COUNT)
+    )
+    recipes = Recipe.objects.bulk_create(
+        Recipe(author=author, name=f'Рецепт {author.username}-{i}',
+               image='recipes/images/benchmark.png',
+               text='Описание рецепта. ' * 20, cooking_time=10 + i)
+        for author in authors
+        for i in range(RECIPES_PER_AUTHOR)
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient=ingredients[(n + k * 7) % INGREDIENTS_COUNT],
+            amount=10 * (k + 1)
+        )
+        for n, recipe in enumerate(recipes)
+        for k in range(INGREDIENTS_PER_RECIPE)
+    )
+    Subscription.objects.bulk_create(
+        Subscription(user=reader, author=author)
+        for author in authors[:SUBSCRIPTIONS_COUNT]
+    )
+    Favorite.objects.bulk_create(
+        Favorite(user=reader, recipe=recipe)
+        for recipe in recipes[:FAVORITES_COUNT]
+    )
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=reader, recipe=recipe)
+        for recipe in recipes[:SHOPPING_CART_COUNT]
+    )
+    shopping_list.add_recipes(
+        reader.pk, [recipe.pk for recipe in recipes[:SHOPPING_CART_COUNT]])
+    counters.repair_drift(counters.find_drift())
+    ranking.refresh_scores()
+    return {
+        'reader': reader,
+        'token': token,
+        'authors': authors,
+        'ingredients': ingredients,
+        'recipes': recipes,
+    }
+
+
+def seed_feed_dataset():
+    """Читатель с подписками на много пишущих авторов и популярный автор.
+
+    Таблица лент ``FeedEntry`` строится сразу, чтобы обе стратегии
+    чтения ленты работали на одних и тех же данных.
+    """
+    reader = User.objects.create_user(
+        email='follower@foodgram.ru', username='follower',
+        first_name='Подписчик', last_name='Бенчмарков',
+        password='benchmark-password'
+    )
+    token = Token.objects.create(user=reader)
+    authors = User.objects.bulk_create(
+        User(email=f'feed{i}@foodgram.ru', username=f'feed{i}',
+             first_name='Автор', last_name=str(i))
+        for i in range(FEED_AUTHORS_COUNT)
+    )
+    Recipe.objects.bulk_create(
+        Recipe(author=author, name=f'Рецепт {author.username}-{i}',
+               image='recipes/images/benchmark.png',
+               text='Описание рецепта. ' * 20, cooking_time=10 + i)
+        for i in range(FEED_RECIPES_PER_AUTHOR)
+        for author in authors
+    )
+    Subscription.objects.bulk_create(
+        Subscription(user=reader, author=author) for author in authors)
+    popular = User.objects.create_user(
+        email='popular@foodgram.ru', username='popular',
+        first_name='Популярный', last_name='Автор'
+    )
+    followers = User.objects.bulk_create(
+        User(email=f'fan{i}@foodgram.ru', username=f'fan{i}',
+             first_name='Читатель', last_name=str(i))
+        for i in range(FEED_FOLLOWERS_COUNT)
+    )
+    Subscription.objects.bulk_create(
+        Subscription(user=follower, author=popular)
+        for follower in followers
+    )
+    feed.rebuild()
+    return {'reader': reader, 'token': token, 'popular': popular}
@@ -0,0 +1,996 @@
+"""Бенчмарки эндпоинтов API с бюджетами по запросам, времени и объёму.
+
+Запуск: ``python manage.py test benchmarks``. Бюджеты лежат в
+``budgets.json``; эндпоинт, превысивший любой из них, роняет тест.
+Путь из переменной ``BENCHMARK_REPORT`` получает JSON-отчёт по прогону.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import tasks
+from api.authentication import TokenCache, tokens
+from api.cache import GLOBAL_VERSION_KEY, bump_global_version
+from foodgram import db_router
+from foodgram.caches import check_shared_cache
+from foodgram.constants import (AVATAR_RENDITIONS, FAVORITE_SCORE_WEIGHT,
+                                SHOPPING_CART_SCORE_WEIGHT)
+from jobs import queue
+from jobs.management.commands import run_worker
+from jobs.models import Job
+from recipes import counters, feed, ranking, shopping_list, short_links
+from recipes.ingredient_index import IngredientIndex, ingredient_index
+from recipes.management.commands import load_ingredients
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingListIngredient)
+from users.models import User
+
+from benchmarks.dataset import IMAGE, seed_dataset, seed_feed_dataset
+
+BUDGETS_PATH = Path(__file__).resolve().parent / 'budgets.json'
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+# Бюджеты считают запросы к default, поэтому реплики отключены. Тесты
+# идут в одном процессе, и кэш токенов работает и на кэше в памяти.
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, PROFILING_SAMPLE_RATE=0,
+                   DATABASE_REPLICAS=[], TOKEN_CACHE_ENABLED=True)
+class BenchmarkCase(TestCase):
+    # Общий для всех наборов, чтобы отчёт после каждого был полным.
+    results = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(BUDGETS_PATH, encoding='utf-8') as file:
+            cls.budgets = json.load(file)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        cls.report()
+
+    @classmethod
+    def report(cls):
+        lines = [f'{"эндпоинт":<28}{"мс":>10}{"запросы":>10}{"байты":>10}']
+        for name, result in sorted(cls.results.items()):
+            lines.append(
+                f'{name:<28}{result["time_ms"]:>10.1f}'
+                f'{result["queries"]:>10}{result["bytes"]:>10}'
+            )
+        sys.stderr.write('\n' + '\n'.join(lines) + '\n')
+        report_path = os.getenv('BENCHMARK_REPORT')
+        if report_path:
+            with open(report_path, 'w', encoding='utf-8') as file:
+                json.dump(cls.results, file, ensure_ascii=False, indent=2)
+
+    def setUp(self):
+        cache.clear()
+        tokens.clear()
+        short_links.codes.clear()
+        # Переходы тестов не должны писаться таймером посреди других тестов.
+        self.addCleanup(short_links.clicks.clear)
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.data["token"].key}')
+
+    def measure(self, name, method, url, data=None, client=None,
+                expected_status=200, **extra):
+        client = client or self.client
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data, format='json',
+                                               **extra)
+            if response.streaming:
+                content = b''.join(response.streaming_content)
+            else:
+                content = response.content
+            elapsed = (time.perf_counter() - start) * 1000
+        self.assertEqual(response.status_code, expected_status, content)
+        self.check_budget(name, {
+            'time_ms': round(elapsed, 2),
+            'queries': len(queries),
+            'bytes': len(content),
+        })
+        return response
+
+    def measure_call(self, name, func, *args):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            func(*args)
+            elapsed = (time.perf_counter() - start) * 1000
+        self.check_budget(name, {
+            'time_ms': round(elapsed, 2),
+            'queries': len(queries),
+            'bytes': 0,
+        })
+
+    def check_budget(self, name, result):
+        self.results[name] = result
+        self.assertIn(name, self.budgets,
+                      f'Для эндпоинта {name} нет бюджета в budgets.json.')
+        for metric, limit in self.budgets[name].items():
+            self.assertLessEqual(
+                result[metric], limit,
+                f'{name}: {metric}={result[metric]} превышает бюджет {limit}.'
+            )
+
+
+class EndpointBenchmark(BenchmarkCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset()
+        cls.reader = cls.data['reader']
+        cls.recipes = cls.data['recipes']
+        cls.ingredients = cls.data['ingredients']
+
+    def recipe_payload(self, offset=0):
+        return {
+            'name': 'Новый рецепт',
+            'text': 'Описание нового рецепта.',
+            'cooking_time': 15,
+            'image': IMAGE,
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 5 + i}
+                for i, ingredient in enumerate(
+                    self.ingredients[offset:offset + 8])
+            ],
+        }
+
+    def test_recipes_list_anonymous(self):
+        self.measure('recipes_list_anonymous', 'get',
+                     '/api/recipes/?limit=20', client=self.anonymous)
+
+    def test_recipes_list(self):
+        self.measure('recipes_list', 'get', '/api/recipes/?limit=20')
+
+    def test_recipes_list_profiled(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1, PROFILING_SLOW_MS=0):
+            response = self.measure('recipes_list_profiled', 'get',
+                                    '/api/recipes/?limit=20')
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+        self.data['reader'].is_staff = True
+        self.data['reader'].save(update_fields=['is_staff'])
+        self.measure('profiling_slow_requests', 'get',
+                     '/api/profiling/slow-requests/')
+
+    def test_recipes_list_cached(self):
+        self.client.get('/api/recipes/?limit=20')
+        self.measure('recipes_list_cached', 'get', '/api/recipes/?limit=20')
+
+    def test_recipe_detail_cached(self):
+        self.client.get(f'/api/recipes/{self.recipes[0].id}/')
+        self.measure('recipe_detail_cached', 'get',
+                     f'/api/recipes/{self.recipes[0].id}/')
+
+    def test_recipes_list_not_modified(self):
+        etag = self.client.get('/api/recipes/?limit=20')['ETag']
+        self.measure('recipes_list_not_modified', 'get',
+                     '/api/recipes/?limit=20', expected_status=304,
+                     HTTP_IF_NONE_MATCH=etag)
+
+    def test_recipe_detail_not_modified(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        etag = self.client.get(url)['ETag']
+        self.measure('recipe_detail_not_modified', 'get', url,
+                     expected_status=304, HTTP_IF_NONE_MATCH=etag)
+
+    def test_recipe_etag_follows_ingredients(self):
+        recipe = self.recipes[0]
+        urls = (f'/api/recipes/{recipe.id}/', '/api/recipes/?limit=20')
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        row = recipe.recipeingredient_set.first()
+        row.amount += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            row.save()
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(
+                url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_recipes_list_cursor(self):
+        url = '/api/recipes/?pagination=cursor&limit=20'
+        for _ in range(3):
+            url = self.client.get(url).data['next']
+        self.measure('recipes_list_cursor', 'get', url)
+
+    def test_refresh_scores(self):
+        recipe, quiet = self.recipes[-1], self.recipes[-2]
+        self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        recipe.refresh_from_db()
+        self.assertEqual(
+            recipe.popular_score,
+            recipe.favorites_count * FAVORITE_SCORE_WEIGHT
+            + recipe.shopping_cart_count * SHOPPING_CART_SCORE_WEIGHT)
+        Recipe.objects.filter(pk=quiet.pk).update(trending_score=5)
+        self.measure_call('refresh_recipe_scores', ranking.refresh_scores)
+        recipe.refresh_from_db()
+        quiet.refresh_from_db()
+        self.assertGreater(recipe.trending_score, 0)
+        self.assertEqual(quiet.trending_score, 0)
+
+    def test_recipes_list_popular(self):
+        self.measure('recipes_list_popular', 'get',
+                     '/api/recipes/?ordering=popular&limit=20')
+
+    def test_recipes_list_trending_cursor(self):
+        url = '/api/recipes/?ordering=trending&pagination=cursor&limit=20'
+        url = self.client.get(url).data['next']
+        self.measure('recipes_list_trending_cursor', 'get', url)
+
+    def test_recipes_search(self):
+        self.measure('recipes_search', 'get',
+                     '/api/recipes/?search=author1-')
+
+    def test_recipes_search_rejects_cursor(self):
+        response = self.client.get(
+            '/api/recipes/?search=author1-&pagination=cursor')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.data)
+
+    def test_recipes_list_filtered(self):
+        self.measure(
+            'recipes_list_filtered', 'get',
+            '/api/recipes/?limit=20&is_favorited=1&is_in_shopping_cart=1'
+        )
+
+    def test_recipes_list_by_author(self):
+        author = self.data['authors'][0]
+        self.measure('recipes_list_by_author', 'get',
+                     f'/api/recipes/?author={author.id}')
+
+    def test_recipe_detail(self):
+        self.measure('recipe_detail', 'get',
+                     f'/api/recipes/{self.recipes[0].id}/')
+
+    def test_recipe_create(self):
+        self.measure('recipe_create', 'post', '/api/recipes/',
+                     self.recipe_payload(), expected_status=201)
+
+    def test_recipe_update(self):
+        response = self.client.post('/api/recipes/', self.recipe_payload(),
+                                    format='json')
+        self.measure('recipe_update', 'patch',
+                     f'/api/recipes/{response.data["id"]}/',
+                     self.recipe_payload(offset=4))
+
+    def test_recipe_delete(self):
+        response = self.client.post('/api/recipes/', self.recipe_payload(),
+                                    format='json')
+        self.measure('recipe_delete', 'delete',
+                     f'/api/recipes/{response.data["id"]}/',
+                     expected_status=204)
+
+    def test_recipe_get_link(self):
+        response = self.measure(
+            'recipe_get_link', 'get',
+            f'/api/recipes/{self.recipes[0].id}/get-link/')
+        path = urlsplit(response.data['short-link']).path
+        self.anonymous.get(path)
+        self.measure('short_link_redirect', 'get', path,
+                     client=self.anonymous, expected_status=302)
+        self.measure_call('short_link_clicks_flush',
+                          short_links.clicks.flush)
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].short_link_clicks, 2)
+
+    def test_short_link_clicks_flush_without_traffic(self):
+        buffer = short_links.ClickBuffer()
+        flushed = threading.Event()
+        with self.settings(SHORT_LINK_FLUSH_INTERVAL=0), \
+                mock.patch.object(buffer, 'flush', flushed.set):
+            buffer.add(self.recipes[0].pk)
+            self.assertTrue(flushed.wait(5))
+
+    def test_short_link_legacy_ids(self):
+        recipe = self.recipes[0]
+        url = f'/s/{recipe.id}/'
+        self.assertEqual(self.anonymous.get(url).status_code, 404)
+        short_links.codes.clear()
+        cache.clear()
+        # Рецепты из набора считаются созданными до миграции.
+        import_module('recipes.migrations.0013_recipe_short_code') \
+            .fill_short_codes(apps, None)
+        new_id = self.client.post('/api/recipes/', self.recipe_payload(),
+                                  format='json').data['id']
+        self.assertEqual(self.anonymous.get(url).status_code, 302)
+        self.assertEqual(
+            self.anonymous.get(f'/s/{new_id}/').status_code, 404)
+
+    def test_short_link_misses_are_cached(self):
+        self.assertEqual(self.anonymous.get('/s/zzzzzzz/').status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.anonymous.get('/s/zzzzzzz/').status_code, 404)
+
+    def test_short_link_deletion_reaches_other_processes(self):
+        recipe = self.recipes[-1]
+        self.assertEqual(short_links.resolve(recipe.short_code), recipe.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertIsNone(short_links.CodeCache().get(recipe.short_code))
+
+    def test_favorite_add(self):
+        self.measure('favorite_add', 'post',
+                     f'/api/recipes/{self.recipes[-1].id}/favorite/',
+                     expected_status=201)
+
+    def test_favorite_remove(self):
+        self.measure('favorite_remove', 'delete',
+                     f'/api/recipes/{self.recipes[0].id}/favorite/',
+                     expected_status=204)
+
+    def test_shopping_cart_add(self):
+        self.measure('shopping_cart_add', 'post',
+                     f'/api/recipes/{self.recipes[-1].id}/shopping_cart/',
+                     expected_status=201)
+
+    def test_shopping_cart_remove(self):
+        self.measure('shopping_cart_remove', 'delete',
+                     f'/api/recipes/{self.recipes[0].id}/shopping_cart/',
+                     expected_status=204)
+
+    def test_favorites_bulk_add(self):
+        self.measure('favorites_bulk_add', 'post',
+                     '/api/recipes/favorite/bulk/',
+                     {'ids': [recipe.id for recipe in self.recipes[:40]]})
+
+    def test_favorites_bulk_remove(self):
+        self.measure('favorites_bulk_remove', 'delete',
+                     '/api/recipes/favorite/bulk/',
+                     {'ids': [recipe.id for recipe in self.recipes[:40]]})
+
+    def test_shopping_cart_bulk_add(self):
+        self.measure('shopping_cart_bulk_add', 'post',
+                     '/api/recipes/shopping_cart/bulk/',
+                     {'ids': [recipe.id for recipe in self.recipes[:40]]})
+
+    def test_bulk_statuses(self):
+        present, absent = self.recipes[0], self.recipes[-1]
+        count = absent.favorites_count
+        self.client.post(f'/api/recipes/{absent.id}/favorite/')
+        response = self.client.post(
+            '/api/recipes/favorite/bulk/',
+            {'ids': [present.id, absent.id, 10 ** 9, present.id]},
+            format='json')
+        self.assertEqual(response.data['results'], [
+            {'id': present.id, 'status': 'exists'},
+            {'id': absent.id, 'status': 'exists'},
+            {'id': 10 ** 9, 'status': 'not_found'},
+        ])
+        absent.refresh_from_db()
+        self.assertEqual(absent.favorites_count, count + 1)
+        self.client.delete(f'/api/recipes/{absent.id}/favorite/')
+        response = self.client.delete(
+            '/api/recipes/favorite/bulk/',
+            {'ids': [absent.id, present.id, 10 ** 9]}, format='json')
+        self.assertEqual(response.data['results'], [
+            {'id': absent.id, 'status': 'absent'},
+            {'id': present.id, 'status': 'removed'},
+            {'id': 10 ** 9, 'status': 'not_found'},
+        ])
+        absent.refresh_from_db()
+        self.assertEqual(absent.favorites_count, count)
+
+    def test_recipe_detail_counters_follow_bulk_changes(self):
+        recipe = self.recipes[-1]
+        url = f'/api/recipes/{recipe.id}/'
+        count = self.client.get(url).data['favorites_count']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/recipes/favorite/bulk/',
+                             {'ids': [recipe.id]}, format='json')
+        self.assertEqual(self.client.get(url).data['favorites_count'],
+                         count + 1)
+
+    def test_counter_drift(self):
+        recipe = self.recipes[0]
+        recipe.refresh_from_db()
+        expected = recipe.favorites_count
+        Recipe.objects.filter(pk=recipe.pk).update(
+            favorites_count=expected + 5)
+        self.assertEqual(counters.find_drift(), {
+            'favorites_count': [(recipe.pk, expected + 5, expected)]})
+        output = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('sync_counters', '--check', stdout=output)
+        self.assertIn(f'favorites_count #{recipe.pk}', output.getvalue())
+        self.assertTrue(counters.find_drift())
+        call_command('sync_counters', stdout=StringIO())
+        self.assertEqual(counters.find_drift(), {})
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, expected)
+
+    def test_shopping_cart_bulk_statuses(self):
+        present, absent = self.recipes[0], self.recipes[-1]
+        response = self.client.post(
+            '/api/recipes/shopping_cart/bulk/',
+            {'ids': [absent.id, present.id]}, format='json')
+        self.assertEqual(response.data['results'], [
+            {'id': absent.id, 'status': 'added'},
+            {'id': present.id, 'status': 'exists'},
+        ])
+        self.assertEqual(shopping_list.find_drift(), {})
+
+    def test_shopping_cart_clear(self):
+        self.measure('shopping_cart_clear', 'delete',
+                     '/api/recipes/shopping_cart/')
+
+    def test_shopping_list_follows_orm_changes(self):
+        recipe = self.recipes[-1]
+        cart = ShoppingCart.objects.create(user=self.reader, recipe=recipe)
+        row = recipe.recipeingredient_set.first()
+        row.amount += 3
+        row.save()
+        RecipeIngredient.objects.create(
+            recipe=recipe, amount=7, ingredient=Ingredient.objects.exclude(
+                recipes=recipe).first())
+        recipe.recipeingredient_set.last().delete()
+        self.assertEqual(shopping_list.find_drift(), {})
+        cart.delete()
+        self.assertEqual(shopping_list.find_drift(), {})
+
+    def test_shopping_list_repair(self):
+        ShoppingListIngredient.objects.filter(user=self.reader).update(
+            total_amount=1)
+        shopping_list.repair_drift(shopping_list.find_drift())
+        self.assertEqual(shopping_list.find_drift(), {})
+
+    def test_download_shopping_cart(self):
+        self.measure('download_shopping_cart', 'get',
+                     '/api/recipes/download_shopping_cart/')
+
+    def test_download_shopping_cart_csv(self):
+        self.measure('download_shopping_cart_csv', 'get',
+                     '/api/recipes/download_shopping_cart/?format=csv')
+
+    def test_download_shopping_cart_json(self):
+        self.measure('download_shopping_cart_json', 'get',
+                     '/api/recipes/download_shopping_cart/?format=json')
+
+    def test_ingredients_search(self):
+        self.measure('ingredients_search', 'get',
+                     '/api/ingredients/?name=ингредиент 01')
+
+    def test_ingredients_list(self):
+        self.measure('ingredients_list', 'get', '/api/ingredients/')
+
+    def test_ingredient_index_follows_shared_version(self):
+        # Индекс другого процесса видит загрузку без сигналов.
+        other = IngredientIndex()
+        other.all()
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='яблоко', measurement_unit='шт')])
+        ingredient_index.invalidate()
+        self.assertEqual(len(other.search('яблоко')), 1)
+
+    @override_settings(INGREDIENT_INDEX_CHECK_INTERVAL=0)
+    def test_ingredient_index_follows_database(self):
+        # Версия в кэше не менялась, как в другом процессе без общего кэша.
+        other = IngredientIndex()
+        other.all()
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='яблоко', measurement_unit='шт')])
+        self.assertEqual(len(other.search('яблоко')), 1)
+
+    def test_ingredient_detail(self):
+        self.measure('ingredient_detail', 'get',
+                     f'/api/ingredients/{self.ingredients[0].id}/')
+
+    def test_users_list(self):
+        self.measure('users_list', 'get', '/api/users/?limit=20')
+
+    def test_user_detail(self):
+        self.measure('user_detail', 'get',
+                     f'/api/users/{self.data["authors"][0].id}/')
+
+    def test_users_me(self):
+        self.measure('users_me', 'get', '/api/users/me/')
+
+    def test_users_me_cached_token(self):
+        self.client.get('/api/users/me/')
+        self.measure('users_me_cached_token', 'get', '/api/users/me/')
+
+    def test_avatar_renditions_reach_cached_user(self):
+        self.client.put('/api/users/me/avatar/', {'avatar': IMAGE},
+                        format='json')
+        self.assertEqual(
+            self.client.get('/api/users/me/').data['avatar_renditions'], {})
+        tasks.build_renditions('users.User', self.reader.pk, 'avatar',
+                               'avatar_renditions', AVATAR_RENDITIONS)
+        self.assertNotEqual(
+            self.client.get('/api/users/me/').data['avatar_renditions'], {})
+
+    def test_avatar_renditions_reach_other_processes(self):
+        # Воркер — отдельный процесс: своё соединение с кэшем и свой LRU
+        # токенов. Сброс доходит до веб-процесса только через общий кэш.
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        with self.settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+        }}, TOKEN_CACHE_LOCAL_TTL=0):
+            self.client.put('/api/users/me/avatar/', {'avatar': IMAGE},
+                            format='json')
+            self.assertEqual(self.client.get(
+                '/api/users/me/').data['avatar_renditions'], {})
+            worker_cache = caches.create_connection('default')
+            with mock.patch('api.cache.cache', worker_cache), \
+                    mock.patch('api.authentication.cache', worker_cache), \
+                    mock.patch('api.tasks.tokens', TokenCache()):
+                tasks.build_renditions(
+                    'users.User', self.reader.pk, 'avatar',
+                    'avatar_renditions', AVATAR_RENDITIONS)
+            self.assertNotEqual(self.client.get(
+                '/api/users/me/').data['avatar_renditions'], {})
+
+    def test_writes_use_fresh_user(self):
+        self.client.get('/api/users/me/')
+        User.objects.filter(pk=self.reader.pk).update(recipes_count=42)
+        self.client.put('/api/users/me/avatar/', {'avatar': IMAGE},
+                        format='json')
+        self.reader.refresh_from_db()
+        self.assertEqual(self.reader.recipes_count, 42)
+
+    def test_token_cache_disabled(self):
+        self.client.get('/api/users/me/')
+        with self.settings(TOKEN_CACHE_ENABLED=False):
+            self.measure('users_me_uncached_token', 'get', '/api/users/me/')
+            self.client.post('/api/auth/token/logout/')
+            self.assertEqual(
+                self.client.get('/api/users/me/').status_code, 401)
+
+    def test_logout_revokes_cached_token(self):
+        self.client.get('/api/users/me/')
+        self.measure('token_logout', 'post', '/api/auth/token/logout/',
+                     expected_status=204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_subscriptions(self):
+        self.measure('subscriptions', 'get',
+                     '/api/users/subscriptions/?limit=10&recipes_limit=3')
+
+    def test_subscribe(self):
+        self.measure('subscribe', 'post',
+                     f'/api/users/{self.data["authors"][-1].id}/subscribe/',
+                     expected_status=201)
+
+    def test_unsubscribe(self):
+        self.measure('unsubscribe', 'delete',
+                     f'/api/users/{self.data["authors"][0].id}/subscribe/',
+                     expected_status=204)
+
+    def test_metrics(self):
+        self.client.get('/api/recipes/?limit=20')
+        self.measure('metrics', 'get', '/metrics', client=self.anonymous)
+
+    def test_token_login(self):
+        self.measure('token_login', 'post', '/api/auth/token/login/',
+                     {'email': self.reader.email,
+                      'password': 'benchmark-password'},
+                     client=self.anonymous)
+
+
+class FeedBenchmark(BenchmarkCase):
+    """Сравнивает ленту fan-in и fan-out на 100 авторах по 20 рецептов.
+
+    Чтение сравнивается на первой и на пятой странице, запись — как
+    стоимость раскладки нового рецепта автора с 1000 подписчиков.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_feed_dataset()
+
+    def read_feed(self, strategy):
+        with self.settings(FEED_STRATEGY=strategy):
+            self.measure(f'feed_{strategy}', 'get',
+                         '/api/recipes/feed/?limit=20')
+            url = '/api/recipes/feed/?limit=20'
+            for _ in range(4):
+                url = self.client.get(url).data['next']
+            self.measure(f'feed_{strategy}_page5', 'get', url)
+
+    def test_feed_fan_in(self):
+        self.read_feed(feed.FAN_IN)
+
+    def test_feed_fan_out(self):
+        self.read_feed(feed.FAN_OUT)
+
+    def test_feed_strategies_match(self):
+        pages = {}
+        for strategy in (feed.FAN_IN, feed.FAN_OUT):
+            url = '/api/recipes/feed/?limit=20'
+            pages[strategy] = []
+            with self.settings(FEED_STRATEGY=strategy):
+                for _ in range(3):
+                    data = self.client.get(url).data
+                    pages[strategy].append(data['results'])
+                    url = data['next']
+        self.assertEqual(pages[feed.FAN_IN], pages[feed.FAN_OUT])
+
+    def test_feed_fan_out_write(self):
+        recipe = Recipe.objects.create(
+            author=self.data['popular'], name='Новый рецепт',
+            image='recipes/images/benchmark.png', text='Описание.',
+            cooking_time=15
+        )
+        self.measure_call('feed_fan_out_write', feed.fan_out_recipe,
+                          recipe.pk)
+
+
+class AsyncViewsTest(BenchmarkCase):
+    """Асинхронные представления отвечают так же, как вьюсеты под WSGI."""
+
+    ASGI_URLCONF = 'foodgram.asgi_urls'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset()
+        cls.recipe = cls.data['recipes'][0]
+
+    def aget(self, url, token=None, **headers):
+        if token is None:
+            token = self.data['token'].key
+        if token:
+            headers['authorization'] = f'Token {token}'
+        with self.settings(ROOT_URLCONF=self.ASGI_URLCONF):
+            response = async_to_sync(self.async_client.get)(
+                url, headers=headers)
+            # resolver_match ленивый и разрешается по текущему urlconf.
+            self.assertEqual(response.resolver_match.func.__module__,
+                             'api.async_views', url)
+        return response
+
+    def assertSameResponse(self, url, client, token=None):
+        expected = client.get(url)
+        response = self.aget(url, token)
+        self.assertEqual(response.status_code, expected.status_code, url)
+        self.assertEqual(response.json(), expected.json(), url)
+        self.assertEqual(response.get('ETag'), expected.get('ETag'), url)
+        return response
+
+    def test_matches_sync_views(self):
+        urls = (
+            '/api/recipes/?limit=5',
+            '/api/recipes/?limit=5&offset=5',
+            '/api/recipes/?pagination=cursor&limit=5',
+            '/api/recipes/?ordering=popular&limit=5',
+            '/api/recipes/?is_favorited=1&is_in_shopping_cart=1',
+            f'/api/recipes/?author={self.recipe.author_id}',
+            f'/api/recipes/{self.recipe.id}/',
+            '/api/recipes/999999/',
+            '/api/ingredients/?name=ингредиент 01',
+            '/api/users/subscriptions/?limit=3&recipes_limit=2',
+        )
+        for url in urls:
+            self.assertSameResponse(url, self.client)
+        for url in urls[:-1]:
+            self.assertSameResponse(url, self.anonymous, token='')
+
+    def test_not_modified(self):
+        for url in ('/api/recipes/?limit=5',
+                    f'/api/recipes/{self.recipe.id}/'):
+            etag = self.aget(url)['ETag']
+            self.assertEqual(
+                self.aget(url, if_none_match=etag).status_code, 304)
+
+    def test_auth_errors(self):
+        for url, token in (('/api/recipes/', 'invalid'),
+                           ('/api/users/subscriptions/', '')):
+            response = self.aget(url, token)
+            self.assertEqual(response.status_code, 401, url)
+            self.assertEqual(response['WWW-Authenticate'], 'Token', url)
+
+    def test_unsafe_methods_use_sync_views(self):
+        with self.settings(ROOT_URLCONF=self.ASGI_URLCONF):
+            response = async_to_sync(self.async_client.post)(
+                '/api/recipes/', {'name': ''},
+                content_type='application/json',
+                headers={'authorization': f'Token {self.data["token"].key}'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.json())
+
+
+class LoadIngredientsTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def load(self, *args):
+        output = StringIO()
+        call_command('load_ingredients', *args, verbosity=0,
+                     stdout=output, stderr=StringIO())
+        return output.getvalue()
+
+    def test_json_reader_waits_for_separator(self):
+        text = '[12345, true, {"name": "мука"}, "x"]'
+        for size in range(1, len(text) + 1):
+            with mock.patch.object(load_ingredients, 'READ_CHUNK_SIZE',
+                                   size):
+                self.assertEqual(
+                    list(load_ingredients.iter_json_array(StringIO(text))),
+                    [12345, True, {'name': 'мука'}, 'x'])
+
+    def test_json_reader_rejects_truncated_file(self):
+        for text in ('[1, 23', '[1, tr', '[{"name": "мука"}', '[1 2]'):
+            with self.assertRaises(ValueError):
+                list(load_ingredients.iter_json_array(StringIO(text)))
+
+    def test_csv_reader_skips_header(self):
+        self.assertEqual(
+            list(load_ingredients.iter_csv_rows(StringIO(
+                'name,measurement_unit\nмука,г\n\nсахар,г\n'))),
+            [{'name': 'мука', 'measurement_unit': 'г'},
+             {'name': 'сахар', 'measurement_unit': 'г'}])
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write('ingredients.json', json.dumps([
+            {'name': 'соль', 'measurement_unit': 'г'},
+            {'name': 'мука', 'measurement_unit': 'г'},
+            {'name': 'мука', 'measurement_unit': 'г'},
+        ]))
+        output = self.load(path, '--dry-run')
+        self.assertIn('+ мука, г', output)
+        self.assertNotIn('+ соль', output)
+        self.assertIn('новых ингредиентов 1', output)
+        self.assertEqual(Ingredient.objects.count(), 1)
+
+    def test_batch_size(self):
+        path = self.write('ingredients.csv', ''.join(
+            f'продукт {i},г\n' for i in range(5)))
+        with CaptureQueriesContext(connection) as queries:
+            self.load(path, '--batch-size', '2')
+        inserts = [query for query in queries.captured_queries
+                   if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(Ingredient.objects.count(), 6)
+
+
+class InlineExecutor(Executor):
+    """Пул, выполняющий задачу сразу в вызывающем потоке."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+class CrashingExecutor(Executor):
+    """Пул, процесс которого упал посреди задачи."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool())
+        return future
+
+
+class BrokenExecutor(Executor):
+    """Пул, сломанный ещё до отправки задачи."""
+
+    def submit(self, fn, *args, **kwargs):
+        raise BrokenProcessPool()
+
+
+@override_settings(JOB_RETRY_DELAY=10, CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(MEDIA_ROOT, 'cache')}})
+class JobQueueTest(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        for patcher in (
+            mock.patch.dict(queue.registry, {
+                'tests.ok': queue.Task(self.calls.append, 'tests.ok', 3, 60),
+                'tests.fail': queue.Task(self.fail_task, 'tests.fail', 3, 60),
+            }),
+            # execute закрывает соединение потока пула, а здесь это
+            # соединение теста с открытой транзакцией.
+            mock.patch('jobs.queue.connection'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def fail_task():
+        raise RuntimeError('Сбой задачи.')
+
+    @staticmethod
+    def expire(job):
+        Job.objects.filter(pk=job.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1))
+
+    def work(self, *executors):
+        output = StringIO()
+        with mock.patch.object(run_worker.Command, 'make_executor',
+                               side_effect=executors):
+            call_command('run_worker', '--once', stdout=output)
+        return output.getvalue()
+
+    def test_claim_takes_expired_lease(self):
+        job = queue.enqueue('tests.ok', 1)
+        first, = queue.claim(5)
+        self.assertEqual(queue.claim(5), [])
+        self.expire(first)
+        second, = queue.claim(5)
+        self.assertEqual((second.pk, second.attempts), (job.pk, 2))
+        self.assertNotEqual(second.lease, first.lease)
+        # Итог истёкшей аренды не трогает задачу новой.
+        self.assertTrue(queue.execute(first))
+        self.assertTrue(Job.objects.filter(lease=second.lease).exists())
+        self.assertTrue(queue.execute(second))
+        self.assertFalse(Job.objects.filter(pk=job.pk).exists())
+
+    def test_expired_last_attempt_fails(self):
+        job = queue.enqueue('tests.ok', 1)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, attempts=job.max_attempts,
+            locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(queue.claim(5), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_retry_backoff(self):
+        job = queue.enqueue('tests.fail')
+        delays = []
+        for _ in range(job.max_attempts):
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            claimed, = queue.claim(1)
+            started = timezone.now()
+            with self.assertLogs('jobs.queue', 'ERROR'):
+                self.assertFalse(queue.execute(claimed))
+            job.refresh_from_db()
+            delays.append(round((job.run_at - started).total_seconds()))
+        self.assertEqual(delays[:-1], [10, 20])
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('Сбой задачи.', job.last_error)
+
+    def test_crashed_pool_fails_running_jobs(self):
+        job = queue.enqueue('tests.ok', 1)
+        output = self.work(CrashingExecutor(), InlineExecutor())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertEqual(job.last_error, run_worker.BROKEN_POOL_ERROR)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('с ошибкой 1', output)
+
+    def test_broken_pool_releases_unsent_jobs(self):
+        job = queue.enqueue('tests.ok', 1)
+        output = self.work(BrokenExecutor(), InlineExecutor())
+        self.assertFalse(Job.objects.filter(pk=job.pk).exists())
+        self.assertEqual(self.calls, [1])
+        self.assertIn('выполнено 1', output)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SharedCacheCheckTest(SimpleTestCase):
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'],
+                       TOKEN_CACHE_ENABLED=False)
+    def test_replicas_require_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            check_shared_cache()
+
+    @override_settings(DATABASE_REPLICAS=[], TOKEN_CACHE_ENABLED=True)
+    def test_token_cache_requires_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            check_shared_cache()
+
+    @override_settings(DATABASE_REPLICAS=[], TOKEN_CACHE_ENABLED=False)
+    def test_process_cache_without_shared_features(self):
+        check_shared_cache()
+
+    def test_worker_requires_shared_cache(self):
+        with self.assertRaises(CommandError):
+            call_command('run_worker', '--once')
+
+
+@skipUnless('replica_1' in settings.DATABASES,
+            'Нет реплики replica_1: задайте SQLITE_REPLICAS или '
+            'DB_REPLICA_HOSTS.')
+@override_settings(DATABASE_REPLICAS=['replica_1'], PROFILING_SAMPLE_RATE=0)
+class ReplicaRoutingTest(TransactionTestCase):
+    """Чтения с реплики, закрепление после записи и откат на ``default``.
+
+    В тестах ``replica_1`` — зеркало ``default``; данные на нём видны
+    только после коммита, поэтому здесь ``TransactionTestCase``.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        tokens.clear()
+        db_router._down_until.clear()
+        self.addCleanup(db_router._down_until.clear)
+        self.user, self.author = (
+            User.objects.create_user(
+                email=f'{name}@foodgram.ru', username=name,
+                first_name=name, last_name=name, password='password')
+            for name in ('reader', 'author'))
+        self.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+        self.url = f'/api/ingredients/{self.ingredient.id}/'
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=(
+            f'Token {Token.objects.create(user=self.user).key}'))
+
+    def request(self, url, client=None, method='get'):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica_1']) as replica:
+            response = getattr(client or self.client, method)(url)
+        return response, len(primary), len(replica)
+
+    def assertReadsFrom(self, alias, url, client=None):
+        response, primary, replica = self.request(url, client)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            'replica_1' if replica and not primary else 'default',
+            alias, (primary, replica))
+
+    def test_safe_reads_use_replica(self):
+        self.assertReadsFrom('replica_1', self.url, self.anonymous)
+        self.assertReadsFrom('replica_1', f'/api/users/{self.author.id}/',
+                             self.anonymous)
+
+    def test_writer_reads_primary(self):
+        response, _, replica = self.request(
+            f'/api/users/{self.author.id}/subscribe/', method='post')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(replica, 0)
+        self.assertReadsFrom('default', self.url)
+        self.assertReadsFrom('replica_1', self.url, self.anonymous)
+        cache.delete(db_router.PINNED_KEY.format(self.user.pk))
+        self.assertReadsFrom('replica_1', self.url)
+
+    def test_recent_changes_read_primary(self):
+        cache.set(GLOBAL_VERSION_KEY, 1, None)
+        self.assertReadsFrom('replica_1', '/api/recipes/', self.anonymous)
+        bump_global_version()
+        self.assertReadsFrom('default', '/api/recipes/', self.anonymous)
+
+    def test_replica_down_falls_back_to_primary(self):
+        replica = connections['replica_1']
+        with CaptureQueriesContext(replica) as queries, mock.patch.object(
+                replica, 'ensure_connection',
+                side_effect=OperationalError('нет соединения')):
+            response = self.anonymous.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 0)
+        self.assertIn('replica_1', db_router._down_until)
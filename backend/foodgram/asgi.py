@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+# Горячие GET-эндпоинты под ASGI обслуживают асинхронные представления.
+os.environ.setdefault('ROOT_URLCONF', 'foodgram.asgi_urls')
 
 application = get_asgi_application()
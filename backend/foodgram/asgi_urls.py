@@ -0,0 +1,23 @@
+"""Маршруты для запуска под ASGI.
+
+Горячие GET-эндпоинты обслуживают асинхронные представления из
+``api.async_views``, всё остальное — те же маршруты, что под WSGI.
+"""
+from django.urls import path
+
+from api import async_views
+from foodgram import urls
+from recipes.views import aredirect_short_link
+
+urlpatterns = [
+    path('api/recipes/', async_views.recipe_list, name='recipes-list'),
+    path('api/recipes/<int:pk>/', async_views.recipe_detail,
+         name='recipes-detail'),
+    path('api/ingredients/', async_views.ingredient_list,
+         name='ingredients-list'),
+    path('api/users/subscriptions/', async_views.subscriptions,
+         name='users-subscriptions'),
+    path('s/<short_code:code>/', aredirect_short_link,
+         name='recipe_short_link'),
+    *urls.urlpatterns,
+]
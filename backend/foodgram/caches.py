@@ -0,0 +1,32 @@
+"""Требование общего кэша для частей, которые сбрасывают его из процесса.
+
+Кэш токенов, закрепление за основной базой при репликах и сброс версий
+из воркера очереди работают, только если запись в кэш одного процесса
+видна остальным. Кэши из ``PROCESS_CACHE_BACKENDS`` живут в памяти
+процесса, и с ними эти части либо выключены, либо не запускаются.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+def is_shared():
+    return (settings.CACHES['default']['BACKEND']
+            not in settings.PROCESS_CACHE_BACKENDS)
+
+
+def shared_cache_error(purpose):
+    return (f'{purpose} нужен общий для процессов кэш, а не '
+            f'{settings.CACHES["default"]["BACKEND"]}: задайте '
+            'CACHE_BACKEND и CACHE_LOCATION.')
+
+
+def check_shared_cache():
+    """Не даёт запуститься с кэшем процесса там, где нужен общий."""
+    if is_shared():
+        return
+    if settings.TOKEN_CACHE_ENABLED:
+        raise ImproperlyConfigured(shared_cache_error(
+            'Для кэша токенов (TOKEN_CACHE_ENABLED)'))
+    if settings.DATABASE_REPLICAS:
+        raise ImproperlyConfigured(shared_cache_error(
+            f'С репликами ({", ".join(settings.DATABASE_REPLICAS)})'))
@@ -6,7 +6,25 @@ INGREDIENT_MAX_AMOUNT = 32767
 RECIPE_MAX_LENGTH = 256
 RECIPE_MIN_COOKING_TIME = 1
 RECIPE_MAX_COOKING_TIME = 32767
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_SHORT_CODE_LENGTH = 7
 
 USER_EMAIL_MAX_LENGTH = 254
 USER_MAX_LENGTH = 150
 USER_REGEX = r'^[\w.@+-]+$'
+
+RECIPE_IMAGE_RENDITIONS = {
+    'card': (480, 480),
+    'detail': (1200, 1200),
+}
+AVATAR_RENDITIONS = {
+    'avatar': (96, 96),
+    'avatar_2x': (192, 192),
+}
+
+JOB_NAME_MAX_LENGTH = 255
+
+FAVORITE_SCORE_WEIGHT = 1
+SHOPPING_CART_SCORE_WEIGHT = 2
+
+BULK_RECIPES_MAX_LENGTH = 100
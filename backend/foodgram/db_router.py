@@ -0,0 +1,138 @@
+"""Чтение с реплик базы с защитой от отставания.
+
+Безопасные запросы к вьюсетам с ``ReplicaReadsMixin`` и к асинхронным
+обработчикам читают с одной реплики из ``DATABASE_REPLICAS``; реплики
+выбираются по кругу. Запись и все чтения после неё в том же запросе
+идут в ``default``, а пользователь, который что-то записал, ещё
+``DATABASE_REPLICA_PIN_SECONDS`` секунд читает только с ``default``.
+Туда же уходят чтения, которые ``use_primary`` пометил как зависящие от
+свежих изменений. Реплика, к которой не удалось подключиться,
+пропускается ``DATABASE_REPLICA_RETRY_SECONDS`` секунд; если живых
+реплик нет, чтение идёт в ``default``. Вне запросов (команды, воркер
+очереди) реплики не используются.
+
+Закрепление хранится в кэше ``default`` и должно быть видно всем
+процессам, поэтому с репликами нужен общий кэш — это проверяет
+``foodgram.caches.check_shared_cache``.
+"""
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+PINNED_KEY = 'db:pinned:{}'
+
+_current = ContextVar('db_routing', default=None)
+_turns = itertools.count()
+_down_until = {}
+
+
+class Routing:
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+@contextmanager
+def routing():
+    state = Routing()
+    token = _current.set(state)
+    try:
+        yield state
+    finally:
+        _current.reset(token)
+
+
+def use_primary():
+    """Переводит оставшиеся чтения текущего запроса на ``default``."""
+    state = _current.get()
+    if state is not None:
+        state.replica = None
+
+
+def is_healthy(alias):
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        return False
+    return True
+
+
+def pick_replica():
+    replicas = settings.DATABASE_REPLICAS
+    start = next(_turns)
+    for offset in range(len(replicas)):
+        alias = replicas[(start + offset) % len(replicas)]
+        if _down_until.get(alias, 0) > time.monotonic():
+            continue
+        if is_healthy(alias):
+            return alias
+        _down_until[alias] = (time.monotonic()
+                              + settings.DATABASE_REPLICA_RETRY_SECONDS)
+    return None
+
+
+def _is_pinned(user):
+    return user.is_authenticated and cache.get(
+        PINNED_KEY.format(user.pk)) is not None
+
+
+def choose(request):
+    """Реплика для запроса или ``None``, если читать надо с ``default``."""
+    if (not settings.DATABASE_REPLICAS
+            or request.method not in SAFE_METHODS
+            or _is_pinned(request.user)):
+        return None
+    return pick_replica()
+
+
+def finish(request, state):
+    if state.wrote and request.user.is_authenticated:
+        cache.set(PINNED_KEY.format(request.user.pk), 1,
+                  settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None:
+            return None
+        if state.wrote or state.replica is None:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadsMixin:
+    """Читает с реплики, если запрос безопасный и пользователь не закреплён.
+
+    Реплика выбирается после аутентификации: запрос токена и всё, что
+    было до него, читается с ``default``.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with routing() as state:
+            self.db_routing = state
+            response = super().dispatch(request, *args, **kwargs)
+            finish(self.request, state)
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.db_routing.replica = choose(request)
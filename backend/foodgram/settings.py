@@ -23,11 +23,15 @@ INSTALLED_APPS = [
     'djoser',
     'users',
     'recipes',
+    'jobs',
+    'metrics',
     'api'
 ]
 
 MIDDLEWARE = [
+    'metrics.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -36,7 +40,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'foodgram.urls'
+ROOT_URLCONF = os.getenv('ROOT_URLCONF', 'foodgram.urls')
 
 TEMPLATES = [
     {
@@ -66,6 +70,53 @@ DATABASES = {
     }
 }
 
+USE_SQLITE = os.getenv('USE_SQLITE', default='False').lower() == 'true'
+
+if USE_SQLITE:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            # Воркер очереди пишет в базу параллельно с сервером.
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+        }
+    }
+
+# Реплики для чтения: DB_REPLICA_HOSTS — хосты Postgres через запятую
+# (порт через двоеточие), с SQLite — SQLITE_REPLICAS, пути к файлам.
+if USE_SQLITE:
+    REPLICA_DATABASES = [
+        {**DATABASES['default'], 'NAME': path}
+        for path in os.getenv('SQLITE_REPLICAS', '').split(',') if path
+    ]
+else:
+    REPLICA_DATABASES = [
+        {**DATABASES['default'], 'HOST': host,
+         'PORT': port or DATABASES['default']['PORT'],
+         'OPTIONS': {'connect_timeout': int(
+             os.getenv('DB_REPLICA_CONNECT_TIMEOUT', 2))}}
+        for host, _, port in (
+            address.partition(':')
+            for address in os.getenv('DB_REPLICA_HOSTS', '').split(',')
+            if address
+        )
+    ]
+
+for number, replica in enumerate(REPLICA_DATABASES, 1):
+    DATABASES[f'replica_{number}'] = {**replica,
+                                      'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+
+# Сколько секунд после записи пользователь читает только с default.
+DATABASE_REPLICA_PIN_SECONDS = float(
+    os.getenv('DATABASE_REPLICA_PIN_SECONDS', 5))
+
+DATABASE_REPLICA_RETRY_SECONDS = float(
+    os.getenv('DATABASE_REPLICA_RETRY_SECONDS', 30))
+
 AUTH_USER_MODEL = "users.User"
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -99,18 +150,97 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+# Кэши, которые не видны другим процессам: воркерам gunicorn, очереди
+# задач, командам manage.py. С ними работает только один процесс.
+PROCESS_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 300))
+
+JOB_WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', 2))
+
+JOB_VISIBILITY_TIMEOUT = int(os.getenv('JOB_VISIBILITY_TIMEOUT', 300))
+
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+
+JOB_RETRY_DELAY = int(os.getenv('JOB_RETRY_DELAY', 10))
+
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+
+INGREDIENT_INDEX_CHECK_INTERVAL = float(
+    os.getenv('INGREDIENT_INDEX_CHECK_INTERVAL', 5))
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 72))
+
+TRENDING_WINDOW_HOURS = float(os.getenv('TRENDING_WINDOW_HOURS', 24 * 14))
+
+# fan_in — выборка по подпискам, fan_out — таблица лент FeedEntry.
+FEED_STRATEGY = os.getenv('FEED_STRATEGY', 'fan_in')
+
+FEED_BACKFILL_LIMIT = int(os.getenv('FEED_BACKFILL_LIMIT', 100))
+
+# Доля профилируемых запросов к API, от 0 до 1.
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.01))
+
+PROFILING_SLOW_MS = float(os.getenv('PROFILING_SLOW_MS', 500))
+
+PROFILING_BUFFER_SIZE = int(os.getenv('PROFILING_BUFFER_SIZE', 100))
+
+# Общий каталог снимков метрик для нескольких воркеров gunicorn.
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+
+SHORT_LINK_CACHE_SIZE = int(os.getenv('SHORT_LINK_CACHE_SIZE', 100000))
+
+SHORT_LINK_FLUSH_INTERVAL = float(os.getenv('SHORT_LINK_FLUSH_INTERVAL', 10))
+
+SHORT_LINK_LOCAL_TTL = int(os.getenv('SHORT_LINK_LOCAL_TTL', 60))
+
+SHORT_LINK_CACHE_TIMEOUT = int(os.getenv('SHORT_LINK_CACHE_TIMEOUT', 86400))
+
+SHORT_LINK_MISS_TIMEOUT = int(os.getenv('SHORT_LINK_MISS_TIMEOUT', 60))
+
+# По умолчанию токены кэшируются, только если кэш общий: иначе сброс
+# при выходе не дошёл бы до других процессов.
+TOKEN_CACHE_ENABLED = os.getenv(
+    'TOKEN_CACHE_ENABLED',
+    str(CACHES['default']['BACKEND'] not in PROCESS_CACHE_BACKENDS)
+).lower() == 'true'
+
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', 300))
+
+# Срок записи в LRU процесса: дольше него отозванный токен в других
+# процессах не живёт.
+TOKEN_CACHE_LOCAL_TTL = float(os.getenv('TOKEN_CACHE_LOCAL_TTL', 10))
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 6,
-    'SEARCH_PARAM': 'name',
+    'SEARCH_PARAM': 'search',
 }
 
 DJOSER = {
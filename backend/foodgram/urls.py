@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from metrics.views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', metrics, name='metrics'),
     path('', include('recipes.urls'))
 ]
@@ -0,0 +1,19 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at',
+                    'locked_until')
+    list_filter = ('status',)
+    search_fields = ('name',)
+    readonly_fields = ('last_error', 'created_at')
+    actions = ('requeue',)
+
+    @admin.action(description="Перезапустить выбранные задачи")
+    def requeue(self, request, queryset):
+        queryset.update(status=Job.QUEUED, attempts=0, run_at=timezone.now(),
+                        lease=None, locked_until=None)
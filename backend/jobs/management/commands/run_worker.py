@@ -0,0 +1,127 @@
+import signal
+import threading
+from concurrent.futures import (FIRST_COMPLETED, BrokenExecutor,
+                                ProcessPoolExecutor, ThreadPoolExecutor,
+                                wait)
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from foodgram import caches
+from jobs import queue
+
+BROKEN_POOL_ERROR = 'Процесс пула завершился, не выполнив задачу.'
+
+
+def _setup_process():
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в базе данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=settings.JOB_WORKER_CONCURRENCY,
+            help='Число одновременно выполняемых задач'
+        )
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Выполнять задачи в пуле процессов, а не потоков'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.JOB_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, в секундах'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и завершиться'
+        )
+
+    def make_executor(self, processes, concurrency):
+        if processes:
+            connections.close_all()
+            return ProcessPoolExecutor(concurrency,
+                                       initializer=_setup_process)
+        return ThreadPoolExecutor(concurrency, thread_name_prefix='jobs')
+
+    def handle(self, *args, **options):
+        # Задачи сбрасывают версии в кэше и кэш токенов: с кэшем в памяти
+        # процесса сброс остался бы в воркере и не дошёл до веб-процессов.
+        if not caches.is_shared():
+            raise CommandError(
+                caches.shared_cache_error('Воркеру очереди задач'))
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        concurrency = max(options['concurrency'], 1)
+        executor = self.make_executor(options['processes'], concurrency)
+        self.stdout.write(
+            f'Воркер запущен: {concurrency} '
+            f'{"процессов" if options["processes"] else "потоков"}.')
+        self.done = self.failed = 0
+        pending = {}
+        try:
+            while not self.stopping.is_set():
+                free = concurrency - len(pending)
+                jobs = queue.claim(free) if free else []
+                intact = self.submit(executor, jobs, pending)
+                if intact and not pending:
+                    if options['once']:
+                        break
+                    self.stopping.wait(options['poll_interval'])
+                    continue
+                if intact:
+                    finished, _ = wait(
+                        pending, timeout=options['poll_interval'],
+                        return_when=FIRST_COMPLETED
+                    )
+                    intact = self.collect(finished, pending)
+                if not intact:
+                    # Упавший процесс ломает весь пул: остальные задачи
+                    # в нём тоже не завершатся, пул создаётся заново.
+                    self.collect(wait(pending).done, pending)
+                    executor.shutdown()
+                    executor = self.make_executor(options['processes'],
+                                                  concurrency)
+            self.collect(wait(pending).done, pending)
+        finally:
+            executor.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'Воркер остановлен: выполнено {self.done}, '
+            f'с ошибкой {self.failed}.'))
+
+    def submit(self, executor, jobs, pending):
+        """Отдаёт задачи пулу; ``False``, если пул сломан.
+
+        Задачи, которые сломанный пул не принял, возвращаются в очередь.
+        """
+        for index, job in enumerate(jobs):
+            try:
+                pending[executor.submit(queue.execute, job)] = job
+            except BrokenExecutor:
+                for unsent in jobs[index:]:
+                    queue.release(unsent)
+                return False
+        return True
+
+    def collect(self, futures, pending):
+        """Подводит итог завершённых задач; ``False``, если пул сломан."""
+        intact = True
+        for future in futures:
+            job = pending.pop(future)
+            try:
+                succeeded = future.result()
+            except BrokenExecutor:
+                queue.fail(job, BROKEN_POOL_ERROR)
+                succeeded = intact = False
+            self.done += succeeded
+            self.failed += not succeeded
+        return intact
+
+    def stop(self, signum, frame):
+        self.stopping.set()
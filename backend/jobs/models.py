@@ -0,0 +1,49 @@
+from django.db import models
+from django.utils import timezone
+
+from foodgram.constants import JOB_NAME_MAX_LENGTH
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(max_length=JOB_NAME_MAX_LENGTH,
+                            verbose_name="Задача")
+    args = models.JSONField(default=list, blank=True,
+                            verbose_name="Позиционные аргументы")
+    kwargs = models.JSONField(default=dict, blank=True,
+                              verbose_name="Именованные аргументы")
+    status = models.CharField(max_length=16, choices=STATUSES,
+                              default=QUEUED, verbose_name="Статус")
+    attempts = models.PositiveSmallIntegerField(default=0,
+                                                verbose_name="Попыток")
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name="Максимум попыток")
+    run_at = models.DateTimeField(default=timezone.now,
+                                  verbose_name="Запустить после")
+    lease = models.UUIDField(null=True, blank=True, editable=False)
+    locked_until = models.DateTimeField(null=True, blank=True,
+                                        verbose_name="Занята до")
+    last_error = models.TextField(blank=True,
+                                  verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ['run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_at'],
+                         name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
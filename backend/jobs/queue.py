@@ -0,0 +1,155 @@
+"""Очередь фоновых задач в базе данных проекта.
+
+Задачи объявляются декоратором ``task`` в модулях ``tasks.py`` приложений
+и ставятся в очередь через ``enqueue``: запись в таблицу делается в
+текущей транзакции, поэтому воркер увидит задачу только после коммита.
+Воркер (``manage.py run_worker``) забирает задачи ``claim`` с арендой на
+``timeout`` секунд: если он упал, не дойдя до конца, задача снова
+становится видна после окончания аренды. Успешно выполненные задачи
+удаляются, неудачные перезапускаются с растущей задержкой, а после
+``max_attempts`` попыток остаются в таблице со статусом ``failed``.
+"""
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Task:
+    def __init__(self, func, name, max_attempts, timeout):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs):
+        return enqueue(self.name, *args, **kwargs)
+
+
+def task(name=None, max_attempts=None, timeout=None):
+    """Регистрирует функцию как задачу очереди.
+
+    Аргументы задачи должны сериализоваться в JSON.
+    """
+    def decorator(func):
+        registered = Task(
+            func, name or f'{func.__module__}.{func.__qualname__}',
+            max_attempts or settings.JOB_MAX_ATTEMPTS,
+            timeout or settings.JOB_VISIBILITY_TIMEOUT
+        )
+        registry[registered.name] = registered
+        return registered
+    return decorator
+
+
+def enqueue(name, *args, run_at=None, **kwargs):
+    return Job.objects.create(
+        name=name, args=list(args), kwargs=kwargs,
+        max_attempts=registry[name].max_attempts,
+        run_at=run_at or timezone.now()
+    )
+
+
+def _timeout(job):
+    task = registry.get(job.name)
+    return task.timeout if task else settings.JOB_VISIBILITY_TIMEOUT
+
+
+def claim(limit):
+    """Забирает до ``limit`` готовых задач и выдаёт на них аренду.
+
+    Задачи, аренда которых истекла без результата, тоже считаются
+    готовыми; исчерпавшие попытки сразу помечаются ``failed``.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True).filter(
+                Q(status=Job.QUEUED, run_at__lte=now)
+                | Q(status=Job.RUNNING, locked_until__lt=now)
+            )[:limit]
+        )
+        claimed = []
+        for job in jobs:
+            if job.status == Job.RUNNING and job.attempts >= job.max_attempts:
+                job.status = Job.FAILED
+                job.lease = job.locked_until = None
+                job.last_error = 'Истекла аренда последней попытки.'
+                continue
+            job.status = Job.RUNNING
+            job.attempts += 1
+            job.lease = uuid.uuid4()
+            job.locked_until = now + timedelta(seconds=_timeout(job))
+            claimed.append(job)
+        Job.objects.bulk_update(
+            jobs, ['status', 'attempts', 'lease', 'locked_until',
+                   'last_error']
+        )
+    return claimed
+
+
+def _finish(job, error):
+    owned = Job.objects.filter(pk=job.pk, lease=job.lease)
+    if error is None:
+        owned.delete()
+    elif job.attempts >= job.max_attempts:
+        owned.update(status=Job.FAILED, lease=None, locked_until=None,
+                     last_error=error)
+    else:
+        delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+        owned.update(
+            status=Job.QUEUED, lease=None, locked_until=None,
+            run_at=timezone.now() + timedelta(seconds=delay),
+            last_error=error
+        )
+
+
+def fail(job, error):
+    """Записывает ошибку задачи, которую не довёл до конца упавший процесс.
+
+    Как и ошибка самой задачи, тратит попытку.
+    """
+    _finish(job, error)
+
+
+def release(job):
+    """Возвращает в очередь полученную задачу, которую не запустили."""
+    Job.objects.filter(pk=job.pk, lease=job.lease).update(
+        status=Job.QUEUED, lease=None, locked_until=None,
+        attempts=F('attempts') - 1
+    )
+
+
+def execute(job):
+    """Выполняет полученную через ``claim`` задачу и записывает итог.
+
+    Вызывается в потоке или процессе пула, поэтому закрывает своё
+    соединение с базой.
+    """
+    error = None
+    try:
+        if job.name not in registry:
+            raise LookupError(f'Неизвестная задача {job.name}.')
+        registry[job.name](*job.args, **job.kwargs)
+    except Exception:
+        logger.exception('Задача %s завершилась ошибкой', job)
+        error = traceback.format_exc()
+    try:
+        _finish(job, error)
+    finally:
+        connection.close()
+    return error is None
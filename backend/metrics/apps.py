@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class MetricsConfig(AppConfig):
+    name = 'metrics'
+    verbose_name = 'Метрики'
+
+    def ready(self):
+        from metrics import queries
+        queries.install_all()
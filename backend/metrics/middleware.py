@@ -0,0 +1,64 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from metrics import registry
+from metrics.queries import observe_queries
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, sql, duration):
+        self.count += 1
+        self.duration += duration
+
+
+def route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unmatched'
+
+
+class MetricsMiddleware:
+    """Считает запросы, время ответа, SQL и размер ответа по маршрутам."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with observe_queries(queries):
+            response = self.get_response(request)
+        return self.record(request, response, queries, start)
+
+    async def __acall__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with observe_queries(queries):
+            response = await self.get_response(request)
+        return self.record(request, response, queries, start)
+
+    def record(self, request, response, queries, start):
+        duration = time.perf_counter() - start
+        labels = {'route': route(request)}
+        registry.inc('foodgram_http_requests_total', method=request.method,
+                     status=response.status_code, **labels)
+        registry.observe('foodgram_http_request_duration_seconds',
+                         duration, **labels)
+        registry.inc('foodgram_db_queries_total', queries.count, **labels)
+        registry.inc('foodgram_db_query_seconds_total', queries.duration,
+                     **labels)
+        if not response.streaming:
+            registry.observe('foodgram_http_response_size_bytes',
+                             len(response.content), **labels)
+        registry.maybe_flush()
+        return response
@@ -0,0 +1,54 @@
+"""Учёт SQL-запросов, выполненных в рамках текущего запроса.
+
+Соединения с базой привязаны к потоку, а асинхронные представления
+ходят в базу из потоков ``sync_to_async``, поэтому обёртка ставится на
+каждое соединение при подключении, а наблюдателей берёт из контекстной
+переменной: контекст переходит в эти потоки вместе с вызовом.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_observers = ContextVar('query_observers', default=())
+
+
+def _execute(execute, sql, params, many, context):
+    observers = _observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        for observer in observers:
+            observer(sql, duration)
+
+
+def install(connection):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+@receiver(connection_created)
+def install_on_connect(sender, connection, **kwargs):
+    install(connection)
+
+
+def install_all():
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+
+
+@contextmanager
+def observe_queries(observer):
+    """Вызывает ``observer(sql, duration)`` на каждый запрос внутри блока."""
+    token = _observers.set((*_observers.get(), observer))
+    try:
+        yield
+    finally:
+        _observers.reset(token)
@@ -0,0 +1,183 @@
+"""Счётчики и гистограммы процесса в текстовом формате Prometheus.
+
+Метрики копятся в памяти процесса. Если задан ``METRICS_DIR``, каждый
+процесс не чаще раза в ``METRICS_FLUSH_INTERVAL`` секунд сохраняет
+снимок в ``<METRICS_DIR>/<pid>.json``, а ``render`` складывает снимки
+всех процессов: так любой воркер gunicorn отдаёт метрики всего
+контейнера. Снимки завершившихся воркеров остаются в каталоге, чтобы
+счётчики не убывали, поэтому каталог должен очищаться при перезапуске
+контейнера.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                   10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+COUNTERS = {
+    'foodgram_http_requests_total': 'Число запросов.',
+    'foodgram_db_queries_total': 'Число SQL-запросов.',
+    'foodgram_db_query_seconds_total': 'Время SQL-запросов, секунды.',
+    'foodgram_cache_requests_total': 'Обращения к кэшам.',
+}
+HISTOGRAMS = {
+    'foodgram_http_request_duration_seconds': (
+        'Время ответа, секунды.', LATENCY_BUCKETS),
+    'foodgram_http_response_size_bytes': (
+        'Размер ответа, байты.', SIZE_BUCKETS),
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(
+        (label, str(value)) for label, value in labels.items()))
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._flushed_at = 0
+
+    def inc(self, name, labels, value=1):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, labels, value):
+        key = _key(name, labels)
+        buckets = HISTOGRAMS[name][1]
+        with self._lock:
+            histogram = self._histograms.setdefault(
+                key, [0] * (len(buckets) + 1) + [0.0])
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value
+                             in self._counters.items()],
+                'histograms': [[name, labels, histogram]
+                               for (name, labels), histogram
+                               in self._histograms.items()],
+            }
+
+    def maybe_flush(self):
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._flushed_at < settings.METRICS_FLUSH_INTERVAL:
+                return
+            self._flushed_at = now
+        self.flush(directory)
+
+    def flush(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = Path(directory) / f'{os.getpid()}.json'
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, path)
+
+
+_registry = Registry()
+
+
+def inc(name, value=1, **labels):
+    _registry.inc(name, labels, value)
+
+
+def observe(name, value, **labels):
+    _registry.observe(name, labels, value)
+
+
+def maybe_flush():
+    _registry.maybe_flush()
+
+
+def record_cache(name, hit):
+    inc('foodgram_cache_requests_total', cache=name,
+        result='hit' if hit else 'miss')
+
+
+def _snapshots():
+    yield _registry.snapshot()
+    directory = settings.METRICS_DIR
+    if not directory or not os.path.isdir(directory):
+        return
+    own = f'{os.getpid()}.json'
+    for path in Path(directory).glob('*.json'):
+        if path.name == own:
+            continue
+        try:
+            yield json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+
+
+def collect():
+    """Складывает снимки всех процессов."""
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in _snapshots():
+        for name, labels, value in snapshot['counters']:
+            counters[name, tuple(map(tuple, labels))] += value
+        for name, labels, histogram in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(histogram))
+            for i, value in enumerate(histogram):
+                total[i] += value
+    return counters, histograms
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(
+        f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render():
+    counters, histograms = collect()
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        lines += [f'{name}{_labels(labels)} {_number(value)}'
+                  for (metric, labels), value in sorted(counters.items())
+                  if metric == name]
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), histogram):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels, le=bound)} '
+                             f'{cumulative}')
+            lines += [
+                f'{name}_sum{_labels(labels)} {_number(histogram[-1])}',
+                f'{name}_count{_labels(labels)} {cumulative}',
+            ]
+    return '\n'.join(lines) + '\n'
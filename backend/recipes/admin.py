@@ -7,33 +7,46 @@ from .models import (
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     min_num = 1
+    extra = 0
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'author', 'favorites_count')
+    list_display = ('id', 'name', 'author', 'pub_date', 'favorites_count',
+                    'shopping_cart_count', 'short_link_clicks')
+    list_select_related = ('author',)
     search_fields = ('name', 'author__username')
-    list_filter = ('author', 'name')
+    list_filter = ('pub_date',)
+    autocomplete_fields = ('author',)
+    readonly_fields = ('favorites_count', 'shopping_cart_count',
+                       'short_code', 'short_link_clicks',
+                       'has_legacy_link')
+    show_full_result_count = False
     inlines = (RecipeIngredientInline,)
 
-    @admin.display(description="В избранном")
-    def favorites_count(self, obj):
-        return obj.favorited_by.count()
-
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'measurement_unit')
     search_fields = ('name',)
+    list_filter = ('measurement_unit',)
+    show_full_result_count = False
 
 
-@admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class UserRecipeRelationAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
+
+
+@admin.register(Favorite)
+class FavoriteAdmin(UserRecipeRelationAdmin):
+    pass
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('user', 'recipe')
-    search_fields = ('user__username', 'recipe__name')
+class ShoppingCartAdmin(UserRecipeRelationAdmin):
+    pass
@@ -0,0 +1,79 @@
+"""Денормализованные счётчики популярности рецептов и пользователей.
+
+Счётчики меняются на ±1 выражением ``F()`` в той же транзакции, что и
+связь, которую они считают, поэтому параллельные запросы не теряют
+изменений. Каскадные удаления и правки из админки счётчики не трогают —
+расхождения находит и исправляет ``manage.py sync_counters``.
+
+Счётчики рецептов меняют и ``popular_score`` в том же ``UPDATE``.
+Изменения идут через ``QuerySet.update`` без ``post_save``, поэтому
+после них шлётся ``counters_changed`` с моделью и номерами строк.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.dispatch import Signal
+
+from recipes import ranking
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+COUNTERS = {
+    'favorites_count': (Recipe, Favorite, 'recipe'),
+    'shopping_cart_count': (Recipe, ShoppingCart, 'recipe'),
+    'recipes_count': (User, Recipe, 'author'),
+    'subscribers_count': (User, Subscription, 'author'),
+}
+
+counters_changed = Signal()
+
+
+def _values(counter, value):
+    values = {counter: value}
+    if COUNTERS[counter][0] is Recipe:
+        values['popular_score'] = ranking.popular_score(**values)
+    return values
+
+
+def change(counter, pk, delta):
+    change_many(counter, [pk], delta)
+
+
+def change_many(counter, pks, delta):
+    if not pks:
+        return
+    model = COUNTERS[counter][0]
+    model.objects.filter(pk__in=pks).update(
+        **_values(counter, Greatest(F(counter) + delta, 0)))
+    counters_changed.send(sender=model, pks=list(pks))
+
+
+def actual_count(counter):
+    _, related_model, field = COUNTERS[counter]
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+
+
+def find_drift():
+    """Возвращает ``{счётчик: [(pk, хранится, ожидается), ...]}``."""
+    drift = {}
+    for counter, (model, _, _) in COUNTERS.items():
+        rows = list(
+            model.objects.annotate(actual=actual_count(counter))
+            .exclude(**{counter: F('actual')})
+            .order_by('pk').values_list('pk', counter, 'actual')
+        )
+        if rows:
+            drift[counter] = rows
+    return drift
+
+
+def repair_drift(drift):
+    for counter, rows in drift.items():
+        model = COUNTERS[counter][0]
+        pks = [pk for pk, _, _ in rows]
+        model.objects.filter(pk__in=pks).update(
+            **_values(counter, actual_count(counter)))
+        counters_changed.send(sender=model, pks=pks)
@@ -0,0 +1,116 @@
+"""Лента свежих рецептов от авторов, на которых подписан пользователь.
+
+Две стратегии, выбираемые ``FEED_STRATEGY``:
+
+* ``fan_in`` — рецепты авторов из подписок читателя выбираются при
+  чтении по индексу ``(author, -pub_date, -id)``; записи ничего не стоят.
+* ``fan_out`` — при публикации рецепт раскладывается в ``FeedEntry``
+  каждого подписчика фоновой задачей, и чтение ленты — выборка по
+  индексу ``(user, -pub_date, -recipe)`` одной таблицы: страница
+  записей ``feed_entries`` выбирается по курсору ``ENTRY_ORDERING``,
+  а рецепты для неё загружает ``load_recipes``. Лента с ``ordering``
+  по оценкам так не сортируется и читается соединением с рецептами.
+
+Таблица ``FeedEntry`` поддерживается, только пока включён ``fan_out``;
+после переключения стратегии её заполняет ``rebuild``. Сравнение
+стратегий — в ``benchmarks.tests.FeedBenchmark``.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from jobs.queue import enqueue
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription
+
+FAN_IN = 'fan_in'
+FAN_OUT = 'fan_out'
+# Совпадает с ``(-pub_date, -id)`` рецептов, курсоры обеих стратегий
+# взаимозаменяемы.
+ENTRY_ORDERING = ('-pub_date', '-recipe_id')
+
+
+def uses_fan_out():
+    return settings.FEED_STRATEGY == FAN_OUT
+
+
+def filter_feed(queryset, user, strategy=None):
+    """Оставляет в выборке рецептов только ленту пользователя."""
+    if (strategy or settings.FEED_STRATEGY) == FAN_OUT:
+        return queryset.filter(feed_entries__user=user)
+    return queryset.filter(author__in=Subscription.objects.filter(
+        user=user).values('author'))
+
+
+def feed_entries(user, recipes=None):
+    """Записи ленты ``fan_out``; ``recipes`` — выборка с фильтрами запроса."""
+    entries = FeedEntry.objects.filter(user=user).only('pub_date', 'recipe')
+    if recipes is not None:
+        entries = entries.filter(recipe__in=recipes.values('pk'))
+    return entries
+
+
+def load_recipes(entries, recipes):
+    """Рецепты из ``recipes`` в порядке записей ленты ``entries``."""
+    loaded = recipes.in_bulk([entry.recipe_id for entry in entries])
+    return [loaded[entry.recipe_id] for entry in entries
+            if entry.recipe_id in loaded]
+
+
+def _entries(recipes, user_ids):
+    return [
+        FeedEntry(user_id=user_id, author_id=recipe.author_id,
+                  recipe_id=recipe.pk, pub_date=recipe.pub_date)
+        for recipe in recipes
+        for user_id in user_ids
+    ]
+
+
+def fan_out_recipe(recipe_id):
+    """Добавляет рецепт в ленты всех подписчиков автора."""
+    recipe = Recipe.objects.only('author', 'pub_date').filter(
+        pk=recipe_id).first()
+    if recipe is None:
+        return
+    subscribers = Subscription.objects.filter(
+        author_id=recipe.author_id).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        _entries([recipe], subscribers.iterator()),
+        ignore_conflicts=True, batch_size=1000
+    )
+
+
+def add_author(user_id, author_id):
+    """Заполняет ленту последними рецептами нового автора из подписок."""
+    recipes = Recipe.objects.filter(author_id=author_id).only(
+        'author', 'pub_date'
+    ).order_by('-pub_date', '-id')[:settings.FEED_BACKFILL_LIMIT]
+    FeedEntry.objects.bulk_create(_entries(recipes, [user_id]),
+                                  ignore_conflicts=True)
+
+
+def remove_author(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def on_recipe_created(recipe):
+    if uses_fan_out():
+        enqueue('recipes.fan_out_recipe', recipe.pk)
+
+
+def on_subscribed(subscription):
+    if uses_fan_out():
+        add_author(subscription.user_id, subscription.author_id)
+
+
+def on_unsubscribed(subscription):
+    if uses_fan_out():
+        remove_author(subscription.user_id, subscription.author_id)
+
+
+@transaction.atomic
+def rebuild():
+    """Пересобирает все ленты по текущим подпискам."""
+    FeedEntry.objects.all().delete()
+    for user_id, author_id in Subscription.objects.values_list(
+            'user_id', 'author_id').iterator():
+        add_author(user_id, author_id)
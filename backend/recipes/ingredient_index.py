@@ -0,0 +1,139 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Max
+
+from metrics.registry import record_cache
+from recipes.models import Ingredient
+
+VERSION_KEY = 'ingredients:version'
+DB_STATE = {'count': Count('id'), 'last': Max('id')}
+
+
+class IngredientIndex:
+    """Отсортированный индекс ингредиентов в памяти процесса.
+
+    Строится из базы при первом обращении. ``invalidate`` (его зовут
+    сигналы ``Ingredient`` и ``load_ingredients``) меняет версию в общем
+    кэше, и каждый процесс перестраивает индекс, увидев новую версию.
+    С кэшем в памяти процесса версия до других процессов не доходит,
+    поэтому не чаще раза в ``INGREDIENT_INDEX_CHECK_INTERVAL`` секунд
+    индекс сверяет с базой число ингредиентов и наибольший ``id``:
+    добавления и удаления видны и без общего кэша. Раз в
+    ``INGREDIENT_INDEX_TTL`` секунд индекс перестраивается в любом
+    случае — на случай правок, мимо которых прошли и сигналы, и сверка.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._built_at = 0
+        self._checked_at = 0
+
+    def invalidate(self):
+        self._index = None
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+    def _is_stale(self, version):
+        return (
+            self._index is None
+            or version != self._version
+            or time.monotonic() - self._built_at
+            > settings.INGREDIENT_INDEX_TTL
+        )
+
+    def _check_due(self):
+        if (self._index is not None and time.monotonic() - self._checked_at
+                < settings.INGREDIENT_INDEX_CHECK_INTERVAL):
+            return False
+        self._checked_at = time.monotonic()
+        return True
+
+    @staticmethod
+    def _ingredients():
+        # Индекс живёт дольше окна отставания реплик, строим его с default.
+        return Ingredient.objects.using(DEFAULT_DB_ALIAS)
+
+    def _rows(self):
+        return self._ingredients().values_list(
+            'id', 'name', 'measurement_unit')
+
+    def _store(self, rows, version):
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in rows
+        )
+        self._index = (
+            [row[0] for row in rows],
+            [{'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+             for _, pk, name, measurement_unit in rows],
+        )
+        self._version = version
+        self._built_at = time.monotonic()
+        return self._index
+
+    def _snapshot(self):
+        db_state = (self._ingredients().aggregate(**DB_STATE)
+                    if self._check_due() else self._version[1])
+        version = (cache.get(VERSION_KEY), db_state)
+        index = self._index
+        hit = True
+        if self._is_stale(version):
+            with self._lock:
+                index = self._index
+                if self._is_stale(version):
+                    index = self._store(self._rows(), version)
+                    hit = False
+        record_cache('ingredient_index', hit)
+        return index
+
+    async def _asnapshot(self):
+        """Как ``_snapshot``, но без блокировки.
+
+        Одновременные промахи в цикле событий могут построить индекс дважды.
+        """
+        db_state = (await self._ingredients().aaggregate(**DB_STATE)
+                    if self._check_due() else self._version[1])
+        version = (await cache.aget(VERSION_KEY), db_state)
+        index = self._index
+        hit = not self._is_stale(version)
+        if not hit:
+            index = self._store([row async for row in self._rows()],
+                                version)
+        record_cache('ingredient_index', hit)
+        return index
+
+    @staticmethod
+    def _search(snapshot, query):
+        keys, entries = snapshot
+        query = query.strip().casefold()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        substring_hits = [
+            entry for key, entry in zip(keys, entries)
+            if query in key and not key.startswith(query)
+        ]
+        return entries[start:end] + substring_hits
+
+    def all(self):
+        return self._snapshot()[1]
+
+    async def aall(self):
+        return (await self._asnapshot())[1]
+
+    def search(self, query):
+        """Ингредиенты, начинающиеся с ``query``, затем содержащие его."""
+        return self._search(self._snapshot(), query)
+
+    async def asearch(self, query):
+        return self._search(await self._asnapshot(), query)
+
+
+ingredient_index = IngredientIndex()
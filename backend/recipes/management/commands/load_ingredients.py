@@ -1,53 +1,168 @@
+import csv
 import json
+import os
+import time
+from itertools import islice
+
 from django.core.management.base import BaseCommand, CommandError
-from recipes.models import Ingredient
-from django.db import IntegrityError
 from tqdm import tqdm
 
+from foodgram.constants import (INGREDIENT_NAME_MAX_LENGTH,
+                                MEASUREMENT_UNIT_MAX_LENGTH)
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Ingredient
+
+READ_CHUNK_SIZE = 64 * 1024
+CSV_HEADER = ['name', 'measurement_unit']
+
+
+def iter_json_array(file):
+    """Выдаёт элементы JSON-массива верхнего уровня, читая файл частями."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), ''):
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError('Ожидался JSON-массив.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            # Число или ``true`` в конце куска могут быть оборваны и всё
+            # равно разобраться: элемент принимаем, только когда за ним
+            # уже видна запятая или конец массива.
+            after = end
+            while after < len(buffer) and buffer[after] in ' \t\r\n':
+                after += 1
+            if after == len(buffer):
+                break
+            if buffer[after] not in ',]':
+                raise ValueError(
+                    f'Ожидалась запятая или «]», а не «{buffer[after]}».')
+            position = end
+            yield item
+    raise ValueError('Файл JSON оборван.')
+
+
+def iter_csv_rows(file):
+    for row in csv.reader(file):
+        if row and row != CSV_HEADER:
+            yield dict(zip(CSV_HEADER, row))
+
+
+READERS = {
+    'json': iter_json_array,
+    'csv': iter_csv_rows,
+}
+
 
 class Command(BaseCommand):
-    help = 'Загружает ингредиенты из файла JSON'
+    help = 'Загружает ингредиенты из файла JSON или CSV пачками'
 
     def add_arguments(self, parser):
-        parser.add_argument('filename', type=str, help='Путь до JSON-файла с ингредиентами')
+        parser.add_argument(
+            'filename', type=str,
+            help='Путь до JSON- или CSV-файла с ингредиентами'
+        )
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат файла, по умолчанию — по расширению'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк записывать одним запросом'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Показать новые ингредиенты, ничего не записывая'
+        )
+
+    def clean_rows(self, items):
+        for i, item in enumerate(items, start=1):
+            try:
+                name = item['name'].strip()
+                unit = item['measurement_unit'].strip()
+            except (KeyError, TypeError, AttributeError):
+                self.stderr.write(f'[{i}] Пропущено: неверная запись — {item}')
+                continue
+            if not name or not unit:
+                self.stderr.write(f'[{i}] Пропущено: пустые поля — {item}')
+                continue
+            if (len(name) > INGREDIENT_NAME_MAX_LENGTH
+                    or len(unit) > MEASUREMENT_UNIT_MAX_LENGTH):
+                self.stderr.write(f'[{i}] Пропущено: слишком длинно — {item}')
+                continue
+            yield name, unit
+
+    def new_rows(self, batch):
+        existing = set(Ingredient.objects.filter(
+            name__in={name for name, _ in batch}
+        ).values_list('name', 'measurement_unit'))
+        return [row for row in batch if row not in existing]
 
-    def handle(self, *args, **kwargs):
-        filename = kwargs['filename']
+    def handle(self, *args, **options):
+        filename = options['filename']
+        file_format = options['format'] or os.path.splitext(
+            filename)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {filename}')
+        dry_run = options['dry_run']
+        batch_size = max(options['batch_size'], 1)
+        total = Ingredient.objects.count()
+        read_count = new_count = 0
+        seen = set()
+        started = time.monotonic()
         try:
-            with open(filename, encoding='utf-8') as file:
-                data = json.load(file)
+            with open(filename, encoding='utf-8', newline='') as file, tqdm(
+                desc='Загрузка', unit='ингр.',
+                disable=options['verbosity'] < 1
+            ) as progress:
+                rows = self.clean_rows(READERS[file_format](file))
+                while batch := list(islice(rows, batch_size)):
+                    read_count += len(batch)
+                    progress.update(len(batch))
+                    batch = list(dict.fromkeys(batch))
+                    if not dry_run:
+                        Ingredient.objects.bulk_create(
+                            (Ingredient(name=name, measurement_unit=unit)
+                             for name, unit in batch),
+                            ignore_conflicts=True
+                        )
+                        continue
+                    for name, unit in self.new_rows(batch):
+                        if (name, unit) in seen:
+                            continue
+                        seen.add((name, unit))
+                        new_count += 1
+                        self.stdout.write(f'+ {name}, {unit}')
         except FileNotFoundError:
             raise CommandError(f'Файл не найден: {filename}')
-        except json.JSONDecodeError as e:
-            raise CommandError(f'Ошибка чтения JSON: {e}')
-
-        created_count = 0
-        skipped_count = 0
-
-        self.stdout.write(f'Начинаем загрузку {len(data)} ингредиентов...\n')
-
-        for i, item in enumerate(tqdm(data, desc='Загрузка', unit='ингр.'), start=1):
-            try:
-                name = item['name']
-                unit = item['measurement_unit']
-                if not name or not unit:
-                    self.stderr.write(f'[{i}] Пропущено: пустые поля — {item}')
-                    skipped_count += 1
-                    continue
-
-                _, created = Ingredient.objects.get_or_create(
-                    name=name.strip(), measurement_unit=unit.strip()
-                )
-                if created:
-                    created_count += 1
-            except KeyError as e:
-                self.stderr.write(f'[{i}] Пропущено: отсутствует ключ {e} — {item}')
-                skipped_count += 1
-            except IntegrityError as e:
-                self.stderr.write(f'[{i}] Ошибка при сохранении: {e} — {item}')
-                skipped_count += 1
-            except Exception as e:
-                self.stderr.write(f'[{i}] Неизвестная ошибка: {e} — {item}')
-                skipped_count += 1
-
-        self.stdout.write(self.style.SUCCESS(f'Успешно добавлено {created_count} ингредиентов.'))
+        except (ValueError, csv.Error) as e:
+            raise CommandError(f'Ошибка чтения файла: {e}')
+        elapsed = time.monotonic() - started
+        rate = read_count / elapsed if elapsed else read_count
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'Прочитано {read_count} строк, новых ингредиентов '
+                f'{new_count}, в базе не меняется ничего '
+                f'({rate:.0f} строк/с).'))
+            return
+        ingredient_index.invalidate()
+        created_count = Ingredient.objects.count() - total
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {read_count} строк, добавлено {created_count} '
+            f'ингредиентов за {elapsed:.2f} с ({rate:.0f} строк/с).'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes import feed
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок для стратегии fan_out'
+
+    def handle(self, *args, **options):
+        feed.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {FeedEntry.objects.count()}.'))
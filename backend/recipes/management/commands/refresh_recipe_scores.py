@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes import ranking
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает оценки рецептов для сортировок '
+            'popular и trending')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        changed = ranking.refresh_scores()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено оценок: {changed} за '
+            f'{time.monotonic() - started:.2f} с.'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import counters
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики избранного, корзин, рецептов и подписчиков '
+            'с фактическими данными и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить, не исправляя расхождения'
+        )
+
+    def handle(self, *args, **options):
+        drift = counters.find_drift()
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        total = 0
+        for counter, rows in drift.items():
+            for pk, stored, expected in rows:
+                self.stdout.write(
+                    f'{counter} #{pk}: хранится {stored}, '
+                    f'ожидается {expected}'
+                )
+            total += len(rows)
+        if options['check']:
+            raise CommandError(f'Найдено расхождений: {total}.')
+        counters.repair_drift(drift)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено расхождений: {total}.'))
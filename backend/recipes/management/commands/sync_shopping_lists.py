@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import shopping_list
+
+
+class Command(BaseCommand):
+    help = ('Сверяет суммы ингредиентов списков покупок с корзинами '
+            'и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить, не исправляя расхождения'
+        )
+
+    def handle(self, *args, **options):
+        drift = shopping_list.find_drift()
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        for (user_id, ingredient_id), (stored, expected) in sorted(
+                drift.items()):
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'хранится {stored}, ожидается {expected}'
+            )
+        if options['check']:
+            raise CommandError(f'Найдено расхождений: {len(drift)}.')
+        shopping_list.repair_drift(drift)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено расхождений: {len(drift)}.'))
@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-18 01:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_shopping_list_ingredients(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListIngredient = apps.get_model(
+        'recipes', 'ShoppingListIngredient')
+    ShoppingListIngredient.objects.bulk_create(
+        ShoppingListIngredient(
+            user_id=user_id, ingredient_id=ingredient_id, total_amount=total
+        )
+        for user_id, ingredient_id, total in (
+            RecipeIngredient.objects
+            .filter(recipe__shopping_carts__isnull=False)
+            .values_list('recipe__shopping_carts__user', 'ingredient')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_alter_recipeingredient_amount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(default=0, verbose_name='Общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_ingredients', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Ингредиенты списков покупок',
+                'constraints': [models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_ingredient')],
+            },
+        ),
+        migrations.RunPython(
+            populate_shopping_list_ingredients,
+            migrations.RunPython.noop
+        ),
+    ]
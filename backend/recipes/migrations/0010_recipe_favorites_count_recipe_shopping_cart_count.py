@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-18 01:52
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(related_model, field):
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+
+
+def count_relations(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(
+        favorites_count=count_of(apps.get_model('recipes', 'Favorite'),
+                                 'recipe'),
+        shopping_cart_count=count_of(
+            apps.get_model('recipes', 'ShoppingCart'), 'recipe'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(count_relations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2 on 2026-10-18 01:54
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+from foodgram.constants import (FAVORITE_SCORE_WEIGHT,
+                                SHOPPING_CART_SCORE_WEIGHT)
+
+
+def backfill(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    pub_date = Recipe.objects.filter(pk=OuterRef('recipe')).values('pub_date')
+    for name in ('Favorite', 'ShoppingCart'):
+        apps.get_model('recipes', name).objects.update(
+            created_at=Subquery(pub_date))
+    Recipe.objects.update(popular_score=(
+        F('favorites_count') * FAVORITE_SCORE_WEIGHT
+        + F('shopping_cart_count') * SHOPPING_CART_SCORE_WEIGHT
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_favorites_count_recipe_shopping_cart_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popular_score',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность за последнее время'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popular_score', '-pub_date', '-id'], name='recipe_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-pub_date', '-id'], name='recipe_trending_idx'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 02:20
+
+import recipes.models
+from django.db import migrations, models
+
+
+def fill_short_codes(apps, schema_editor):
+    # Рецепты до кодов уже раздавались ссылками /s/<номер>/: они
+    # продолжают работать, новые рецепты открываются только по коду.
+    Recipe = apps.get_model('recipes', 'Recipe')
+    objects = list(Recipe.objects.only('id'))
+    codes = set()
+    while len(codes) < len(objects):
+        codes.add(recipes.models.generate_short_code())
+    for recipe, code in zip(objects, codes):
+        recipe.short_code = code
+        recipe.has_legacy_link = True
+    Recipe.objects.bulk_update(objects, ['short_code', 'has_legacy_link'],
+                               batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='short_code',
+            field=models.CharField(editable=False, max_length=7, null=True, verbose_name='Код короткой ссылки'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='has_legacy_link',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Открывается по старой ссылке /s/<номер>/'),
+        ),
+        migrations.RunPython(fill_short_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='recipe',
+            name='short_code',
+            field=models.CharField(default=recipes.models.generate_short_code, editable=False, max_length=7, unique=True, verbose_name='Код короткой ссылки'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='short_link_clicks',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Переходы по короткой ссылке'),
+        ),
+    ]
@@ -1,3 +1,7 @@
+import secrets
+import string
+
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.conf import settings
@@ -5,8 +9,17 @@ from foodgram.constants import (INGREDIENT_NAME_MAX_LENGTH,
                                 MEASUREMENT_UNIT_MAX_LENGTH,
                                 RECIPE_MAX_LENGTH,
                                 RECIPE_MIN_COOKING_TIME,
+                                RECIPE_SHORT_CODE_LENGTH,
                                 INGREDIENT_MIN_AMOUNT)
 
+SHORT_CODE_ALPHABET = string.digits + string.ascii_letters
+
+
+def generate_short_code():
+    """Случайный код base62: по номеру рецепта его не подобрать."""
+    return ''.join(secrets.choice(SHORT_CODE_ALPHABET)
+                   for _ in range(RECIPE_SHORT_CODE_LENGTH))
+
 
 class Ingredient(models.Model):
     name = models.CharField(
@@ -40,6 +53,9 @@ class Recipe(models.Model):
                             verbose_name="Название рецепта")
     image = models.ImageField(
         upload_to='recipes/images/', verbose_name="Фото рецепта")
+    image_renditions = models.JSONField(
+        default=dict, blank=True, editable=False,
+        verbose_name="Размеры фото")
     text = models.TextField(verbose_name="Описание рецепта")
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name="Время приготовления",
@@ -53,12 +69,48 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Дата публикации")
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения")
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name="В избранном")
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name="В списках покупок")
+    popular_score = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name="Популярность")
+    trending_score = models.FloatField(
+        default=0, editable=False,
+        verbose_name="Популярность за последнее время")
+    short_code = models.CharField(
+        max_length=RECIPE_SHORT_CODE_LENGTH, unique=True,
+        default=generate_short_code, editable=False,
+        verbose_name="Код короткой ссылки")
+    short_link_clicks = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name="Переходы по короткой ссылке")
+    has_legacy_link = models.BooleanField(
+        default=False, editable=False,
+        verbose_name="Открывается по старой ссылке /s/<номер>/")
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ['-pub_date']
         default_related_name = 'recipes'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_pub_date_id_idx'),
+            models.Index(fields=['-popular_score', '-pub_date', '-id'],
+                         name='recipe_popular_idx'),
+            models.Index(fields=['-trending_score', '-pub_date', '-id'],
+                         name='recipe_trending_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -103,6 +155,9 @@ class UserRecipeRelation(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Рецепт"
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True, db_index=True,
+        verbose_name="Дата добавления")
 
     class Meta:
         abstract = True
@@ -127,3 +182,72 @@ class ShoppingCart(UserRecipeRelation):
         verbose_name = "Список покупок"
         verbose_name_plural = "Списки покупок"
         default_related_name = 'shopping_carts'
+
+
+class ShoppingListIngredient(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_ingredients',
+        verbose_name="Пользователь"
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_ingredients',
+        verbose_name="Ингредиент"
+    )
+    total_amount = models.PositiveIntegerField(
+        default=0, verbose_name="Общее количество")
+
+    class Meta:
+        verbose_name = "Ингредиент списка покупок"
+        verbose_name_plural = "Ингредиенты списков покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} — {self.total_amount}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name="Читатель"
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Автор"
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name="Рецепт"
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи лент"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='feed_entry_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_entry_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
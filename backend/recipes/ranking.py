@@ -0,0 +1,78 @@
+"""Предрассчитанные оценки для сортировок ``popular`` и ``trending``.
+
+``popular_score`` — взвешенная сумма денормализованных счётчиков
+избранного и корзин; ``recipes.counters`` меняет её в том же ``UPDATE``,
+что и сами счётчики. ``trending_score`` — та же сумма, где каждое
+добавление за последние ``TRENDING_WINDOW_HOURS`` часов весит тем
+меньше, чем оно старше (период полураспада ``TRENDING_HALF_LIFE_HOURS``).
+Её пересчитывает ``manage.py refresh_recipe_scores``: он читает только
+свежие строки связей по индексу ``created_at`` и трогает только рецепты
+с новой активностью или ненулевой оценкой, а сортировки становятся
+обходом индекса.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from foodgram.constants import (FAVORITE_SCORE_WEIGHT,
+                                SHOPPING_CART_SCORE_WEIGHT)
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+ORDERINGS = {
+    'popular': ('-popular_score', '-pub_date', '-id'),
+    'trending': ('-trending_score', '-pub_date', '-id'),
+}
+
+scores_refreshed = Signal()
+
+
+def popular_score(**counts):
+    """Выражение ``popular_score``.
+
+    ``counts`` подменяют столбцы счётчиков, например их новыми значениями
+    из того же ``UPDATE``: в ``SET`` столбцы читаются до изменения.
+    """
+    counts = {'favorites_count': F('favorites_count'),
+              'shopping_cart_count': F('shopping_cart_count'), **counts}
+    return (counts['favorites_count'] * FAVORITE_SCORE_WEIGHT
+            + counts['shopping_cart_count'] * SHOPPING_CART_SCORE_WEIGHT)
+
+
+def trending_scores(now):
+    since = now - timedelta(hours=settings.TRENDING_WINDOW_HOURS)
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+    scores = defaultdict(float)
+    for model, weight in ((Favorite, FAVORITE_SCORE_WEIGHT),
+                          (ShoppingCart, SHOPPING_CART_SCORE_WEIGHT)):
+        for recipe_id, created_at in model.objects.filter(
+            created_at__gte=since
+        ).values_list('recipe_id', 'created_at').iterator():
+            age = (now - created_at).total_seconds()
+            scores[recipe_id] += weight * 0.5 ** (age / half_life)
+    return {pk: round(score, 6) for pk, score in scores.items()}
+
+
+def refresh_scores():
+    """Пересчитывает ``trending_score``, возвращает число рецептов."""
+    scores = trending_scores(timezone.now())
+    with transaction.atomic():
+        changed = Recipe.objects.filter(trending_score__gt=0).exclude(
+            pk__in=scores).update(trending_score=0)
+        recipes = [
+            Recipe(pk=pk, trending_score=score)
+            for pk, score in scores.items()
+        ]
+        changed += Recipe.objects.bulk_update(
+            recipes, ['trending_score'], batch_size=500)
+    if changed:
+        scores_refreshed.send(sender=Recipe)
+    return changed
+
+
+def order_by(queryset, ordering):
+    return queryset.order_by(*ORDERINGS[ordering])
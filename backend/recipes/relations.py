@@ -0,0 +1,86 @@
+"""Пакетное добавление рецептов в избранное и корзину и удаление из них.
+
+Каждая операция — несколько запросов на весь набор id: проверка
+существования рецептов и связей, один ``bulk_create`` или один
+фильтрованный ``DELETE``, пакетная правка счётчиков и сумм списка
+покупок. Строка пользователя блокируется на время транзакции, чтобы
+параллельные запросы одного пользователя не посчитали одну связь дважды.
+Ту же блокировку до проверки связи берут одиночные добавление и удаление
+в ``api.views``: порядок блокировок везде один — пользователь, рецепты,
+суммы списка покупок.
+"""
+from django.db import transaction
+
+from recipes import counters, shopping_list
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import User
+
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+ABSENT = 'absent'
+NOT_FOUND = 'not_found'
+
+RELATIONS = {
+    Favorite: ('favorites_count', None, None),
+    ShoppingCart: ('shopping_cart_count', shopping_list.add_recipes,
+                   shopping_list.remove_recipes),
+}
+
+
+def lock_user(user):
+    User.objects.select_for_update().filter(pk=user.pk).exists()
+
+
+def _results(recipe_ids, statuses):
+    return [{'id': pk, 'status': statuses[pk]} for pk in recipe_ids]
+
+
+@transaction.atomic
+def add_recipes(model, user, recipe_ids):
+    """Возвращает ``[{'id': ..., 'status': ...}]`` в порядке запроса."""
+    counter, on_add, _ = RELATIONS[model]
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    lock_user(user)
+    found = set(Recipe.objects.filter(
+        pk__in=recipe_ids).values_list('pk', flat=True))
+    present = set(model.objects.filter(
+        user=user, recipe_id__in=found).values_list('recipe_id', flat=True))
+    new = [pk for pk in recipe_ids if pk in found and pk not in present]
+    model.objects.bulk_create(
+        [model(user=user, recipe_id=pk) for pk in new],
+        ignore_conflicts=True
+    )
+    counters.change_many(counter, new, 1)
+    if on_add and new:
+        on_add(user.pk, new)
+    statuses = dict.fromkeys(recipe_ids, NOT_FOUND)
+    statuses.update(dict.fromkeys(present, EXISTS))
+    statuses.update(dict.fromkeys(new, ADDED))
+    return _results(recipe_ids, statuses)
+
+
+@transaction.atomic
+def remove_recipes(model, user, recipe_ids=None):
+    """Удаляет связи с рецептами из ``recipe_ids`` или все связи."""
+    counter, _, on_remove = RELATIONS[model]
+    lock_user(user)
+    relations = model.objects.filter(user=user)
+    if recipe_ids is not None:
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        relations = relations.filter(recipe_id__in=recipe_ids)
+    present = list(relations.values_list('recipe_id', flat=True))
+    if recipe_ids is None:
+        recipe_ids = present
+    with shopping_list.manual():
+        model.objects.filter(user=user, recipe_id__in=present).delete()
+    counters.change_many(counter, present, -1)
+    if on_remove and present:
+        on_remove(user.pk, present)
+    missing = set(recipe_ids) - set(present)
+    statuses = dict.fromkeys(recipe_ids, NOT_FOUND)
+    if missing:
+        statuses.update(dict.fromkeys(Recipe.objects.filter(
+            pk__in=missing).values_list('pk', flat=True), ABSENT))
+    statuses.update(dict.fromkeys(present, REMOVED))
+    return _results(recipe_ids, statuses)
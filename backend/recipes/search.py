@@ -0,0 +1,48 @@
+"""Полнотекстовый поиск рецептов по названию и описанию.
+
+На PostgreSQL используется ``Recipe.search_vector`` с GIN-индексом
+и ранжированием ``SearchRank``; на остальных СУБД (SQLite в тестах) —
+``icontains`` с совпадениями в названии выше совпадений в описании.
+"""
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from foodgram.constants import RECIPE_SEARCH_CONFIG
+
+
+def is_supported(using):
+    return connections[using].vendor == 'postgresql'
+
+
+def recipe_search_vector():
+    return (
+        SearchVector('name', weight='A', config=RECIPE_SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=RECIPE_SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(recipe):
+    using = recipe._state.db
+    if is_supported(using):
+        type(recipe).objects.using(using).filter(pk=recipe.pk).update(
+            search_vector=recipe_search_vector())
+
+
+def search_recipes(queryset, text):
+    if is_supported(queryset.db):
+        query = SearchQuery(text, config=RECIPE_SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-pub_date', '-id')
+    return queryset.filter(
+        Q(name__icontains=text) | Q(text__icontains=text)
+    ).annotate(
+        search_rank=Case(
+            When(name__icontains=text, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    ).order_by('-search_rank', '-pub_date', '-id')
@@ -0,0 +1,230 @@
+"""Поддержка материализованных сумм ингредиентов в списках покупок.
+
+``ShoppingListIngredient`` хранит для каждого пользователя итоговое
+количество каждого ингредиента из рецептов в его корзине. Функции
+модуля меняют суммы на разницу в той же транзакции, что и саму корзину.
+
+Одиночные правки ``ShoppingCart`` и ``RecipeIngredient`` (API, админка,
+ORM) переносятся в суммы сигналами из ``recipes.signals``. Пакетный код,
+который сам считает разницу и пользуется ``bulk_create``/``bulk_update``,
+работает внутри ``manual()``, где сигналы суммы не трогают. Удаления
+каскадом от рецепта, пользователя или ингредиента сигналы пропускают:
+рецепт убирает из сумм ``discard_recipe``, а строки сумм пользователя и
+ингредиента удаляются тем же каскадом. Суммы пользователя меняются под
+блокировкой его строки, как и в ``recipes.relations``.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import QuerySet, Sum
+
+from recipes.models import (RecipeIngredient, ShoppingCart,
+                            ShoppingListIngredient)
+from users.models import User
+
+_manual = ContextVar('shopping_list_manual', default=False)
+
+
+@contextmanager
+def manual():
+    """Отключает пересчёт сумм сигналами: вызывающий считает их сам."""
+    token = _manual.set(True)
+    try:
+        yield
+    finally:
+        _manual.reset(token)
+
+
+def tracks(sender, origin=None):
+    """Нужно ли сигналу ``sender`` менять суммы.
+
+    ``origin`` — источник удаления из ``post_delete``.
+    """
+    if _manual.get():
+        return False
+    if origin is None:
+        return True
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, sender)
+
+
+def _lock_users(user_ids):
+    list(User.objects.select_for_update().filter(
+        pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def _recipe_amounts(recipe_ids):
+    amounts = defaultdict(lambda: defaultdict(int))
+    for recipe_id, ingredient_id, amount in (
+        RecipeIngredient.objects
+        .filter(recipe_id__in=recipe_ids)
+        .values_list('recipe_id', 'ingredient_id', 'amount')
+    ):
+        amounts[recipe_id][ingredient_id] += amount
+    return amounts
+
+
+def apply_deltas(deltas):
+    """Прибавляет ``{(user_id, ingredient_id): delta}`` к суммам."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    user_ids = {user_id for user_id, _ in deltas}
+    ingredient_ids = {ingredient_id for _, ingredient_id in deltas}
+    with transaction.atomic(savepoint=False):
+        _lock_users(user_ids)
+        ShoppingListIngredient.objects.bulk_create(
+            (ShoppingListIngredient(user_id=user_id,
+                                    ingredient_id=ingredient_id)
+             for (user_id, ingredient_id), delta in deltas.items()
+             if delta > 0),
+            ignore_conflicts=True
+        )
+        items = list(
+            ShoppingListIngredient.objects
+            .select_for_update()
+            .filter(user_id__in=user_ids, ingredient_id__in=ingredient_ids)
+        )
+        changed, empty = [], []
+        for item in items:
+            delta = deltas.get((item.user_id, item.ingredient_id))
+            if delta is None:
+                continue
+            item.total_amount = max(item.total_amount + delta, 0)
+            if item.total_amount:
+                changed.append(item)
+            else:
+                empty.append(item.pk)
+        if changed:
+            ShoppingListIngredient.objects.bulk_update(
+                changed, ['total_amount'])
+        if empty:
+            ShoppingListIngredient.objects.filter(pk__in=empty).delete()
+
+
+def add_recipes(user_id, recipe_ids):
+    deltas = defaultdict(int)
+    for amounts in _recipe_amounts(recipe_ids).values():
+        for ingredient_id, amount in amounts.items():
+            deltas[user_id, ingredient_id] += amount
+    apply_deltas(deltas)
+
+
+def remove_recipes(user_id, recipe_ids):
+    deltas = defaultdict(int)
+    for amounts in _recipe_amounts(recipe_ids).values():
+        for ingredient_id, amount in amounts.items():
+            deltas[user_id, ingredient_id] -= amount
+    apply_deltas(deltas)
+
+
+def update_recipe(recipe, old_amounts):
+    """Переносит изменение состава рецепта в списки покупок.
+
+    ``old_amounts`` — ``{ingredient_id: amount}`` до изменения рецепта.
+    """
+    new_amounts = _recipe_amounts([recipe.pk])[recipe.pk]
+    changes = {
+        ingredient_id: new_amounts.get(ingredient_id, 0)
+        - old_amounts.get(ingredient_id, 0)
+        for ingredient_id in set(old_amounts) | set(new_amounts)
+    }
+    changes = {key: delta for key, delta in changes.items() if delta}
+    if not changes:
+        return
+    deltas = {}
+    for user_id in ShoppingCart.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True):
+        for ingredient_id, delta in changes.items():
+            deltas[user_id, ingredient_id] = delta
+    apply_deltas(deltas)
+
+
+def change_recipe_ingredient(old, new):
+    """Переносит правку одной строки состава рецепта в списки покупок.
+
+    ``old`` и ``new`` — ``(recipe_id, ingredient_id, amount)`` до и после
+    правки или ``None``, если строки не было или больше нет.
+    """
+    deltas = defaultdict(int)
+    for row, sign in ((old, -1), (new, 1)):
+        if row is None:
+            continue
+        recipe_id, ingredient_id, amount = row
+        for user_id in ShoppingCart.objects.filter(
+                recipe_id=recipe_id).values_list('user_id', flat=True):
+            deltas[user_id, ingredient_id] += sign * amount
+    apply_deltas(deltas)
+
+
+def discard_recipe(recipe):
+    """Убирает рецепт из сумм всех пользователей перед его удалением."""
+    amounts = _recipe_amounts([recipe.pk])[recipe.pk]
+    deltas = {}
+    for user_id in ShoppingCart.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True):
+        for ingredient_id, amount in amounts.items():
+            deltas[user_id, ingredient_id] = -amount
+    apply_deltas(deltas)
+
+
+def expected_totals(user_id=None):
+    rows = RecipeIngredient.objects.filter(
+        recipe__shopping_carts__isnull=False)
+    if user_id is not None:
+        rows = rows.filter(recipe__shopping_carts__user=user_id)
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in (
+            rows
+            .values_list('recipe__shopping_carts__user', 'ingredient')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+    }
+
+
+def stored_totals():
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in (
+            ShoppingListIngredient.objects
+            .values_list('user_id', 'ingredient_id', 'total_amount')
+        )
+    }
+
+
+def find_drift():
+    """Возвращает ``{(user_id, ingredient_id): (хранится, ожидается)}``."""
+    expected = expected_totals()
+    stored = stored_totals()
+    return {
+        key: (stored.get(key, 0), expected.get(key, 0))
+        for key in set(expected) | set(stored)
+        if stored.get(key, 0) != expected.get(key, 0)
+    }
+
+
+@transaction.atomic
+def rebuild_user(user_id):
+    """Пересчитывает суммы пользователя заново из его корзины."""
+    _lock_users([user_id])
+    ShoppingListIngredient.objects.filter(user_id=user_id).delete()
+    ShoppingListIngredient.objects.bulk_create(
+        ShoppingListIngredient(user_id=user_id, ingredient_id=ingredient_id,
+                               total_amount=total)
+        for (_, ingredient_id), total in expected_totals(user_id).items()
+    )
+
+
+def repair_drift(drift):
+    """Пересобирает суммы пользователей с расхождениями.
+
+    Расхождения служат только списком пользователей: суммы каждого
+    считаются заново под блокировкой, и параллельные правки корзины не
+    попадут в них дважды.
+    """
+    for user_id in sorted({user_id for user_id, _ in drift}):
+        rebuild_user(user_id)
@@ -0,0 +1,225 @@
+"""Короткие ссылки ``/s/<код>/`` на рецепты.
+
+Код — случайная строка base62 из ``Recipe.short_code``, по номеру
+рецепта его не подобрать. Коды разрешаются через LRU процесса на
+``SHORT_LINK_CACHE_SIZE`` записей и общий кэш, так что в базу идёт
+только первый переход по коду. Несуществующие коды тоже кэшируются, на
+``SHORT_LINK_MISS_TIMEOUT`` секунд, и перебор кодов не нагружает базу.
+Удаление рецепта сигналом стирает код из общего кэша; записи LRU живут
+``SHORT_LINK_LOCAL_TTL`` секунд, и в других процессах ссылка на
+удалённый рецепт работает не дольше этого срока.
+
+Переходы копятся в памяти и не позже чем через
+``SHORT_LINK_FLUSH_INTERVAL`` секунд одним ``UPDATE`` прибавляются к
+``Recipe.short_link_clicks``. При штатной остановке процесса остаток
+записывается сразу; процесс, убитый без остановки, теряет переходы
+не более чем за один интервал.
+
+Старые ссылки ``/s/<номер>/`` ведут только на рецепты, созданные до
+появления кодов: миграция отметила их ``has_legacy_link``. Новые рецепты
+по номерам не перебрать.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, F, Value, When
+
+from foodgram.constants import RECIPE_SHORT_CODE_LENGTH
+from metrics.registry import record_cache
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+
+class ShortCodeConverter:
+    regex = f'[0-9A-Za-z]{{1,{RECIPE_SHORT_CODE_LENGTH}}}'
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+CODE_KEY = 'short_links:{}'
+# Номер рецепта для кода, которого нет; настоящие номера начинаются с 1.
+MISSING = 0
+
+
+class CodeCache:
+    """Номера рецептов по кодам: LRU процесса перед общим кэшем.
+
+    ``get`` возвращает номер, ``MISSING`` для известного промаха или
+    ``None``, если код ещё не искали.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._codes = OrderedDict()
+
+    def _get_local(self, code):
+        with self._lock:
+            entry = self._codes.get(code)
+            if entry is None:
+                return None
+            expires, pk = entry
+            if expires < time.monotonic():
+                del self._codes[code]
+                return None
+            self._codes.move_to_end(code)
+        return pk
+
+    def _set_local(self, code, pk):
+        entry = (time.monotonic() + settings.SHORT_LINK_LOCAL_TTL, pk)
+        with self._lock:
+            self._codes[code] = entry
+            self._codes.move_to_end(code)
+            while len(self._codes) > settings.SHORT_LINK_CACHE_SIZE:
+                self._codes.popitem(last=False)
+
+    @staticmethod
+    def _timeout(pk):
+        if pk == MISSING:
+            return settings.SHORT_LINK_MISS_TIMEOUT
+        return settings.SHORT_LINK_CACHE_TIMEOUT
+
+    def get(self, code):
+        pk = self._get_local(code)
+        if pk is None:
+            pk = cache.get(CODE_KEY.format(code))
+            if pk is not None:
+                self._set_local(code, pk)
+        record_cache('short_links', pk is not None)
+        return pk
+
+    async def aget(self, code):
+        pk = self._get_local(code)
+        if pk is None:
+            pk = await cache.aget(CODE_KEY.format(code))
+            if pk is not None:
+                self._set_local(code, pk)
+        record_cache('short_links', pk is not None)
+        return pk
+
+    def set(self, code, pk):
+        cache.set(CODE_KEY.format(code), pk, self._timeout(pk))
+        self._set_local(code, pk)
+
+    async def aset(self, code, pk):
+        await cache.aset(CODE_KEY.format(code), pk, self._timeout(pk))
+        self._set_local(code, pk)
+
+    def discard(self, *keys):
+        with self._lock:
+            for code in keys:
+                self._codes.pop(code, None)
+        cache.delete_many([CODE_KEY.format(code) for code in keys])
+
+    def clear(self):
+        with self._lock:
+            self._codes.clear()
+
+
+class ClickBuffer:
+    """Переходы, ещё не записанные в базу.
+
+    Первый переход после записи заводит таймер, и через
+    ``SHORT_LINK_FLUSH_INTERVAL`` секунд фоновый поток пишет всё
+    накопленное, даже если новых переходов нет.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clicks = Counter()
+        self._timer = None
+
+    def add(self, pk):
+        with self._lock:
+            self._clicks[pk] += 1
+            if self._timer is None:
+                self._timer = threading.Timer(
+                    settings.SHORT_LINK_FLUSH_INTERVAL, self.flush_safely)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _take(self):
+        with self._lock:
+            clicks, self._clicks = self._clicks, Counter()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return clicks
+
+    def clear(self):
+        self._take()
+
+    def flush(self):
+        clicks = self._take()
+        if not clicks:
+            return
+        Recipe.objects.filter(pk__in=clicks).update(
+            short_link_clicks=F('short_link_clicks') + Case(
+                *(When(pk=pk, then=Value(count))
+                  for pk, count in clicks.items()),
+                default=Value(0)))
+
+    def flush_safely(self):
+        """``flush`` для таймера и ``atexit``: ошибку только пишет в лог."""
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Не удалось записать переходы по ссылкам')
+        finally:
+            connection.close()
+
+
+codes = CodeCache()
+clicks = ClickBuffer()
+atexit.register(clicks.flush_safely)
+
+
+def _lookups(code):
+    yield Recipe.objects.filter(short_code=code)
+    if code.isdecimal():
+        # Ссылки, выданные до появления кодов.
+        yield Recipe.objects.filter(pk=int(code), has_legacy_link=True)
+
+
+def _count(pk):
+    if pk == MISSING:
+        return None
+    clicks.add(pk)
+    return pk
+
+
+def resolve(code):
+    """Номер рецепта по коду или ``None``; засчитывает переход."""
+    pk = codes.get(code)
+    if pk is None:
+        for recipes in _lookups(code):
+            pk = recipes.values_list('pk', flat=True).first()
+            if pk is not None:
+                break
+        else:
+            pk = MISSING
+        codes.set(code, pk)
+    return _count(pk)
+
+
+async def aresolve(code):
+    pk = await codes.aget(code)
+    if pk is None:
+        for recipes in _lookups(code):
+            pk = await recipes.values_list('pk', flat=True).afirst()
+            if pk is not None:
+                break
+        else:
+            pk = MISSING
+        await codes.aset(code, pk)
+    return _count(pk)
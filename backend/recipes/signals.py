@@ -0,0 +1,101 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from recipes import feed, search, shopping_list, short_links
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart)
+from users.models import Subscription
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    # После коммита ещё раз: другие процессы могли успеть построить
+    # индекс по данным до него.
+    ingredient_index.invalidate()
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(pre_delete, sender=Recipe)
+def discard_recipe_from_shopping_lists(sender, instance, **kwargs):
+    shopping_list.discard_recipe(instance)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created=False, raw=False,
+                         **kwargs):
+    if created and not raw and shopping_list.tracks(sender):
+        shopping_list.add_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, origin=None, **kwargs):
+    if shopping_list.tracks(sender, origin):
+        shopping_list.remove_recipes(instance.user_id, [instance.recipe_id])
+
+
+def _recipe_ingredient_row(instance):
+    return instance.recipe_id, instance.ingredient_id, instance.amount
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_recipe_ingredient(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None or not shopping_list.tracks(sender):
+        return
+    instance.saved_row = RecipeIngredient.objects.filter(
+        pk=instance.pk).values_list('recipe_id', 'ingredient_id',
+                                    'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def update_shopping_lists(sender, instance, raw=False, **kwargs):
+    if raw or not shopping_list.tracks(sender):
+        return
+    old = getattr(instance, 'saved_row', None)
+    new = _recipe_ingredient_row(instance)
+    if old != new:
+        shopping_list.change_recipe_ingredient(old, new)
+    instance.saved_row = new
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def remove_from_shopping_lists(sender, instance, origin=None, **kwargs):
+    if shopping_list.tracks(sender, origin):
+        shopping_list.change_recipe_ingredient(
+            _recipe_ingredient_row(instance), None)
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_short_link(sender, instance, **kwargs):
+    # После коммита ещё раз: код мог попасть в кэш до него.
+    keys = (instance.short_code, str(instance.pk))
+    short_links.codes.discard(*keys)
+    transaction.on_commit(partial(short_links.codes.discard, *keys))
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, **kwargs):
+    search.update_search_vector(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created=False, raw=False,
+                       **kwargs):
+    if created and not raw:
+        feed.on_recipe_created(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def add_author_to_feed(sender, instance, created=False, raw=False,
+                       **kwargs):
+    if created and not raw:
+        feed.on_subscribed(instance)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_author_from_feed(sender, instance, **kwargs):
+    feed.on_unsubscribed(instance)
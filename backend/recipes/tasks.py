@@ -0,0 +1,7 @@
+from jobs.queue import task
+from recipes import feed
+
+
+@task('recipes.fan_out_recipe')
+def fan_out_recipe(recipe_id):
+    feed.fan_out_recipe(recipe_id)
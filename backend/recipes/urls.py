@@ -1,8 +1,13 @@
-from django.urls import path
+from django.urls import path, register_converter
+
+from recipes.short_links import ShortCodeConverter
 from recipes.views import redirect_short_link
 
 app_name = "recipes"
 
+register_converter(ShortCodeConverter, 'short_code')
+
 urlpatterns = [
-    path('s/<int:pk>/', redirect_short_link, name='recipe_short_link')
+    path('s/<short_code:code>/', redirect_short_link,
+         name='recipe_short_link')
 ]
@@ -1,8 +1,18 @@
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from django.shortcuts import redirect
-from recipes.models import Recipe
 
+from recipes import short_links
 
-def redirect_short_link(request, pk):
-    get_object_or_404(Recipe, id=pk)
+
+def redirect_short_link(request, code):
+    pk = short_links.resolve(code)
+    if pk is None:
+        raise Http404('Рецепт не найден.')
+    return redirect(f'/recipes/{pk}/')
+
+
+async def aredirect_short_link(request, code):
+    pk = await short_links.aresolve(code)
+    if pk is None:
+        raise Http404('Рецепт не найден.')
     return redirect(f'/recipes/{pk}/')
@@ -5,12 +5,21 @@ from .models import User, Subscription
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
-    list_display = ('id', 'email', 'username', 'first_name', 'last_name')
-    list_filter = ("username", "email")
+    list_display = ('id', 'email', 'username', 'first_name', 'last_name',
+                    'recipes_count', 'subscribers_count')
+    list_filter = ('is_staff', 'is_active')
     search_fields = ('email', 'username')
+    readonly_fields = ('recipes_count', 'subscribers_count')
+    fieldsets = BaseUserAdmin.fieldsets + (
+        ("Активность", {'fields': ('recipes_count', 'subscribers_count')}),
+    )
+    show_full_result_count = False
 
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
     search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
+    show_full_result_count = False
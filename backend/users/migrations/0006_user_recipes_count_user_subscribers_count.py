@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 01:52
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(related_model, field):
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+
+
+def count_relations(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    User.objects.update(
+        recipes_count=count_of(apps.get_model('recipes', 'Recipe'),
+                               'author'),
+        subscribers_count=count_of(apps.get_model('users', 'Subscription'),
+                                   'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_avatar_renditions'),
+        ('recipes', '0010_recipe_favorites_count_recipe_shopping_cart_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.RunPython(count_relations, migrations.RunPython.noop),
+    ]
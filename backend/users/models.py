@@ -17,11 +17,20 @@ class User(AbstractUser):
                                  verbose_name="Фамилия", )
     avatar = models.ImageField(upload_to='avatars/', blank=True,
                                null=True, verbose_name="Фото профиля")
+    avatar_renditions = models.JSONField(default=dict, blank=True,
+                                         editable=False,
+                                         verbose_name="Размеры фото профиля")
     username = models.CharField(max_length=USER_MAX_LENGTH, unique=True,
                                 verbose_name="Имя пользователя",
                                 validators=[RegexValidator(
                                     regex=USER_REGEX,
                                     message='Имя пользователя некорректно.')])
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name="Дата изменения")
+    recipes_count = models.PositiveIntegerField(default=0, editable=False,
+                                                verbose_name="Рецептов")
+    subscribers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Подписчиков")
 
     class Meta:
         verbose_name = "Пользователь"